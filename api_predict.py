@@ -1,17 +1,47 @@
 # api_predict.py
 from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from fastapi.routing import APIRoute
 import uvicorn
 import os
+import sys
 import numpy as np
 import io
 import pandas as pd
 import torch
 import json
 import asyncio
+import functools
+import threading
+import time
 from models import FullModel
+from features import CATALOG_FEATURES, REQUIRED_FEATURES, catalog_feature_matrix
+from shared_weights import flat_paths, ensure_flat_weights, is_stale, load_flat_weights
+from torch_threads import configure_interop_threads, configure_intra_threads
+from precision import resolve_precision, bf16_supported, autocast
+from catalog_index import CATALOG_CSV, INDEX_PATH, CatalogIndex, build_index
+from catalog_index import is_stale as catalog_index_is_stale
+from similarity_index import SimilarityIndex
+from explain import AttributionService
+from jobs import JobStore, JobRunner
+from connection_manager import ConnectionManager
+from inference_batcher import InferenceBatcher
+from serving_metrics import (registry, CONTENT_TYPE, REQUEST_SECONDS, PARSE_SECONDS, FEATURE_SECONDS,
+                             INFERENCE_SECONDS, ROWS_PER_REQUEST, ROW_ERRORS, REQUEST_ERRORS,
+                             WS_MESSAGES, WS_CONNECTIONS, TORCH_THREADS)
+from structured_logging import configure_logging, get_logger, new_request_id, request_id_var, SampledErrors
+
+if __name__ == '__main__' and int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+    # multi-worker start: this process only supervises, so become the launcher
+    # before the serving state below is built for nothing. exec rather than
+    # import: spawned workers re-run the main script, which must not be this one.
+    launcher = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+    os.execv(sys.executable, [sys.executable, launcher])
+
+configure_logging()
+logger = get_logger('api')
 
 app = FastAPI()
 
@@ -33,33 +63,160 @@ if os.path.exists("build"):
 @app.middleware("http")
 async def serve_react_app_middleware(request, call_next):
     response = await call_next(request)
-    if response.status_code == 404:
+    # a 404 an API handler returned on purpose (e.g. unknown catalog key) is passed through
+    if response.status_code == 404 and not isinstance(request.scope.get('route'), APIRoute):
         if not request.url.path.startswith("/api") and not request.url.path.startswith("/ws"):
             try:
                 return FileResponse("build/index.html")
             except:
                 pass  # Continue to next handler
     return response
+
+@app.middleware("http")
+async def request_id_middleware(request, call_next):
+    # correlation id for every log line emitted while handling this request
+    request_id = request.headers.get('x-request-id') or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
 MODEL_PATH = 'nasa_model.pth'
 SEQ_LEN = 201
 
+# Number of uvicorn worker processes (multi-worker mode when > 1)
+WORKERS = int(os.getenv('WEB_CONCURRENCY', 1))
+if WORKERS > 1:
+    # every worker answers /metrics from its own registry; the pid label tells them apart
+    registry.const_labels['pid'] = os.getpid()
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+configure_interop_threads()
+
 # Initialize model with error handling for deployment
 model = None
 try:
     if os.path.exists(MODEL_PATH):
         model = FullModel(seq_len=SEQ_LEN, n_tab_features=13, catalog_only=True)  # 13 features for NASA catalog
-        model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
+        if device.type == 'cpu' and WORKERS > 1:
+            ensure_flat_weights(MODEL_PATH)
+        if device.type == 'cpu' and not is_stale(MODEL_PATH):
+            # memory-mapped weights: every worker shares one copy through the page cache
+            load_flat_weights(model, *flat_paths(MODEL_PATH))
+        else:
+            model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
         model.to(device)
         model.eval()
-        print("Model loaded successfully")
+        logger.info("Model loaded successfully", extra={'fields': {'path': MODEL_PATH, 'workers': WORKERS}})
     else:
-        print(f"Warning: Model file {MODEL_PATH} not found. Prediction endpoints will not work.")
+        logger.warning("Model file not found; prediction endpoints will not work", extra={'fields': {'path': MODEL_PATH}})
 except Exception as e:
-    print(f"Error loading model: {e}")
+    logger.exception("Error loading model")
     model = None
 
+# intra-op threads: split the cores between workers, or autotune on a single-row forward pass
+thread_config = configure_intra_threads(model, torch.zeros(1, 13, device=device) if model is not None else None, WORKERS)
+logger.info("Torch threads configured", extra={'fields': dict(thread_config, inter_op=torch.get_num_interop_threads())})
+
+# rows per forward pass for batched scoring / embedding
+EMBED_BATCH_SIZE = 4096
+
+# TORCH_PRECISION=bf16 runs batched inference under bfloat16 autocast
+PRECISION = resolve_precision()
+if PRECISION == 'bf16' and not bf16_supported(device):
+    logger.warning("bfloat16 requested but not natively supported; inference will be slower", extra={'fields': {'device': str(device)}})
+
+def _predict_probs(X):
+    """Planet probability for each row of a float32 feature matrix"""
+    probs = np.empty(len(X), dtype=np.float32)
+    with torch.no_grad(), autocast(device, PRECISION):
+        for i in range(0, len(X), EMBED_BATCH_SIZE):
+            x = torch.from_numpy(X[i:i+EMBED_BATCH_SIZE]).to(device)
+            probs[i:i+EMBED_BATCH_SIZE] = torch.softmax(model(x).float(), dim=1)[:,1].cpu().numpy()
+    return probs
+
+# SHAP attributions run on background workers so they never delay predictions
+EXPLAIN_BACKGROUND = 'nasa_dataset.npz'
+attribution_service = None
+if model is not None and os.path.exists(EXPLAIN_BACKGROUND):
+    _background = np.load(EXPLAIN_BACKGROUND, allow_pickle=True)['X']
+    _background = _background[np.random.default_rng(0).choice(len(_background), size=min(100, len(_background)), replace=False)]
+    attribution_service = AttributionService(model, _background, device,
+                                             workers=int(os.getenv('EXPLAIN_WORKERS', 1)))
+
+# Background batch scoring jobs (see /jobs endpoints below)
+JOBS_DIR = os.getenv('JOBS_DIR', 'jobs')
+job_store = None
+job_runner = None
+
+INVALID_FEATURES_ERROR = "Missing, non-numeric or out-of-range catalog feature value"
+
+def _score_dataframe(df, timings=None):
+    """Batched scoring of a cleaned dataframe -> DataFrame(id, prob_planet, error)"""
+    if 'kepid' in df.columns:
+        ids = df['kepid'].astype(str).tolist()
+    else:
+        ids = [f"candidate_{idx}" for idx in df.index]
+    probs = np.full(len(df), np.nan, dtype=np.float32)
+    errors = [None] * len(df)
+    t0 = time.perf_counter()
+    try:
+        X, invalid = catalog_feature_matrix(df, return_invalid=True)
+    except KeyError as e:
+        X, errors = None, [f"Missing required column: {e}"] * len(df)
+    t1 = time.perf_counter()
+    if X is not None:
+        for pos in np.flatnonzero(invalid):
+            errors[pos] = INVALID_FEATURES_ERROR
+        if not invalid.all():
+            probs[~invalid] = _predict_probs(X[~invalid])
+    if timings is not None:
+        timings['features'] = t1 - t0
+        timings['inference'] = time.perf_counter() - t1
+    return pd.DataFrame({'id': ids, 'prob_planet': probs, 'error': errors})
+
+if model is not None:
+    job_store = JobStore(JOBS_DIR)
+    # columns are mapped once per file from its header, then each chunk is cleaned row by row
+    job_runner = JobRunner(job_store, lambda columns: functools.partial(_apply_column_plan, plan=_column_plan(columns)),
+                           _score_dataframe, workers=int(os.getenv('JOB_WORKERS', 1)))
+
+# Precomputed scores and nearest-neighbour index for the bundled KOI catalog
+catalog_index = None
+similarity_index = None
+
+def _load_catalog_index():
+    global catalog_index
+    try:
+        # scored at the serving precision, so lookups agree with live predictions
+        if catalog_index_is_stale(INDEX_PATH, MODEL_PATH, CATALOG_CSV, PRECISION):
+            logger.info("Rebuilding catalog index", extra={'fields': {'path': INDEX_PATH, 'precision': PRECISION}})
+            build_index(model, MODEL_PATH, device, CATALOG_CSV, INDEX_PATH, PRECISION)
+        catalog_index = CatalogIndex(INDEX_PATH)
+        logger.info("Catalog index loaded", extra={'fields': {'path': INDEX_PATH, 'rows': len(catalog_index)}})
+    except Exception:
+        logger.exception("Catalog index unavailable")
+
+def _load_similarity_index():
+    global similarity_index
+    try:
+        similarity_index = SimilarityIndex.from_catalog(CATALOG_CSV, model, device)
+        logger.info("Similarity index loaded", extra={'fields': {'rows': len(similarity_index)}})
+    except Exception:
+        logger.exception("Similarity index unavailable")
+
+def _load_catalog_indexes():
+    _load_catalog_index()
+    _load_similarity_index()
+
+if model is not None and os.path.exists(CATALOG_CSV):
+    # rebuilding (first start or new model weights) takes a few seconds; don't hold up startup
+    threading.Thread(target=_load_catalog_indexes, name='catalog-index', daemon=True).start()
+
 @app.get("/")
 async def serve_react_app():
     """Serve the React application"""
@@ -119,149 +276,324 @@ async def serve_react_app():
         </html>
         """)
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+# upper bound on neighbours per candidate for /similar
+SIMILAR_MAX_K = 100
+
+# /catalog and /similar answer every error with a status code and {"error": ...}:
+# 400 bad input, 404 unknown key, 503 index still loading
+def _error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+@app.get("/catalog/{key}")
+async def catalog_lookup(key: str):
+    """Precomputed prediction for a known KOI, by kepid or kepoi_name (e.g. K00752.01)"""
+    if catalog_index is None:
+        return _error("Catalog index not available yet", 503)
+    matches = catalog_index.lookup(key)
+    if not matches:
+        return _error(f"Unknown kepid or kepoi_name: {key}", 404)
+    return {'key': key, 'matches': matches}
+
+@app.post("/catalog/lookup")
+async def catalog_batch_lookup(payload: dict):
+    """Batch lookup: {"ids": [10797460, "K00752.01", ...]}"""
+    if catalog_index is None:
+        return _error("Catalog index not available yet", 503)
+    ids = payload.get('ids', [])
+    if not isinstance(ids, list) or not all(isinstance(k, (str, int)) and not isinstance(k, bool) for k in ids):
+        return _error("'ids' must be a list of kepids or kepoi_names")
+    results = {}
+    missing = []
+    for key in ids:
+        matches = catalog_index.lookup(key)
+        if matches:
+            results[str(key)] = matches
+        else:
+            missing.append(key)
+    return {'results': results, 'missing': missing, 'model_sha256': catalog_index.meta['model_sha256']}
+
+@app.post("/similar")
+async def similar_candidates(payload: dict):
+    """k nearest known KOIs for one candidate or a batch.
+
+    {"candidate": {...} | "candidates": [{...}], "k": 10, "space": "features" | "embedding"}
+    Candidates use the catalog fields listed in features.CATALOG_FEATURES.
+    """
+    if similarity_index is None:
+        return _error("Similarity index not available yet", 503)
+    candidates = payload.get('candidates') or [payload.get('candidate', {})]
+    if not isinstance(candidates, list) or not all(isinstance(c, dict) for c in candidates):
+        return _error("'candidates' must be a list of objects")
+    k = payload.get('k', 10)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= SIMILAR_MAX_K:
+        return _error(f"'k' must be an integer from 1 to {SIMILAR_MAX_K}")
+    space = payload.get('space', 'features')
+    try:
+        X = catalog_feature_matrix(candidates)
+        neighbours = similarity_index.query(X, k=k, space=space)
+    except KeyError as e:
+        return _error(f"Missing required field: {e}")
+    except ValueError as e:
+        return _error(str(e))
+    return {'space': space, 'k': k,
+            'results': [{'id': c.get('id', c.get('kepid', f'candidate_{i}')), 'neighbors': n}
+                        for i, (c, n) in enumerate(zip(candidates, neighbours))]}
+
+@app.post("/explain")
+async def explain_candidates(payload: dict):
+    """Per-feature SHAP attributions (log-odds of planet) for one candidate or a batch.
+
+    {"candidate": {...} | "candidates": [{...}], "wait": true}
+    With "wait": false only cached attributions are returned; the rest are
+    queued and listed under "pending" so clients can poll; rows whose
+    explanation failed are listed under "errors" and should not be polled.
+    """
+    if attribution_service is None:
+        return {"error": "Explanations not available (model or background data missing)"}
+    candidates = payload.get('candidates') or [payload.get('candidate', {})]
+    try:
+        X = catalog_feature_matrix(candidates)
+    except KeyError as e:
+        return {"error": f"Missing required field: {e}"}
+    except ValueError as e:
+        return {"error": str(e)}
+    ids = [c.get('id', c.get('kepid', f'candidate_{i}')) for i, c in enumerate(candidates)]
+    futures = attribution_service.submit(X)
+    if payload.get('wait', True):
+        try:
+            # awaiting wrapped futures keeps the event loop free while workers compute
+            results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        except Exception as e:
+            logger.warning("Explanation failed", extra={'fields': {'error': str(e)}})
+            return {"error": f"Explanation failed: {str(e)}"}
+        return {'explanations': [dict(r, id=i) for i, r in zip(ids, results)]}
+    done = [dict(f.result(), id=i) for i, f in zip(ids, futures) if f.done() and f.exception() is None]
+    errors = [{'id': i, 'error': f"Explanation failed: {f.exception()}"}
+              for i, f in zip(ids, futures) if f.done() and f.exception() is not None]
+    pending = [i for i, f in zip(ids, futures) if not f.done()]
+    return {'explanations': done, 'pending': pending, 'errors': errors}
+
+@app.post("/jobs")
+async def submit_job(file: UploadFile = File(...)):
+    """Queue a CSV of any size for background scoring; poll /jobs/{job_id}"""
+    if job_runner is None:
+        return {"error": "AI model not loaded. Please ensure model files are available."}
+    job_id = job_store.create(file.filename)
+    try:
+        with open(job_store.input_path(job_id), 'wb') as f:
+            while chunk := await file.read(1 << 20):
+                f.write(chunk)
+    except Exception as e:
+        # nothing to score: don't leave a queued job without an input file
+        job_store.delete(job_id)
+        logger.warning("Job upload failed", extra={'fields': {'job_id': job_id, 'error': str(e)}})
+        return {"error": f"Upload failed: {str(e)}"}
+    job_runner.submit(job_id)
+    logger.info("Job queued", extra={'fields': {'job_id': job_id, 'filename': file.filename}})
+    return {'job_id': job_id, 'status': 'queued'}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_store.get(job_id) if job_store is not None else None
+    if job is None:
+        return {"error": f"Unknown job: {job_id}"}
+    total = job['total_rows']
+    job['progress'] = min(job['done_rows'] / total, 1.0) if total else (1.0 if job['status'] == 'done' else 0.0)
+    job.pop('owner_pid', None)
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Scored rows as CSV (id, prob_planet, error) once the job is done"""
+    job = job_store.get(job_id) if job_store is not None else None
+    if job is None:
+        return {"error": f"Unknown job: {job_id}"}
+    if job['status'] != 'done':
+        return {"error": f"Job is {job['status']}", 'status': job['status']}
+    return FileResponse(job_store.result_path(job_id), media_type='text/csv', filename=f'{job_id}.csv')
+
 @app.post("/predict_csv")
 async def predict_csv(file: UploadFile = File(...)):
-    print(f"Received file: {file.filename}, size: {file.size}, content_type: {file.content_type}")
+    with REQUEST_SECONDS.time('predict_csv'):
+        result = await _predict_csv(file)
+    if 'error' in result:
+        REQUEST_ERRORS.inc('predict_csv')
+    return result
+
+async def _predict_csv(file):
+    logger.debug("Received file", extra={'fields': {'filename': file.filename, 'size': file.size, 'content_type': file.content_type}})
 
     try:
         content = await file.read()
-        print(f"Read {len(content)} bytes from file")
-
-        # Universal CSV parsing with intelligent column detection
-        df = None
-
-        # Try multiple parsing strategies
-        parsing_strategies = [
-            # Strategy 1: Default pandas reading
-            lambda: pd.read_csv(io.BytesIO(content)),
-
-            # Strategy 2: With flexible options
-            lambda: pd.read_csv(
-                io.BytesIO(content),
-                sep=',',
-                quotechar='"',
-                quoting=0,  # QUOTE_MINIMAL
-                escapechar='\\',
-                on_bad_lines='skip',
-                low_memory=False
-            ),
-
-            # Strategy 3: Try different separators
-            lambda: pd.read_csv(
-                io.BytesIO(content),
-                sep=None,
-                engine='python',
-                quoting=3,  # QUOTE_NONE
-                on_bad_lines='skip'
-            ),
-
-            # Strategy 4: Manual parsing for severely malformed files
-            lambda: _manual_csv_parse(content)
-        ]
-
-        for i, strategy in enumerate(parsing_strategies):
-            try:
-                df = strategy()
-                print(f"Successfully parsed CSV using strategy {i+1}")
-                break
-            except Exception as e:
-                print(f"Strategy {i+1} failed: {str(e)}")
-                continue
-
-        if df is None:
-            return {"error": "Could not parse CSV file with any strategy"}
-
-        # Clean the dataframe
-        df = _clean_dataframe(df)
-
-        if df is None:
-            return {"error": "Failed to parse CSV file"}
-
-        # Handle various CSV formats with intelligent column detection
-        print(f"Detected columns: {list(df.columns)}")
+        logger.debug("Read upload", extra={'fields': {'bytes': len(content)}})
+        t_parse = time.perf_counter()
 
-        # Set default ID if not available
-        if 'kepid' not in df.columns:
-            df['kepid'] = [f"candidate_{i}" for i in range(len(df))]
-
-        # Ensure we have the required columns for prediction
-        required_cols = ['koi_period', 'koi_time0bk']
-        missing_required = [col for col in required_cols if col not in df.columns]
-
-        if missing_required:
-            return {"error": f"Missing required columns for prediction: {missing_required}. Available columns: {list(df.columns)}"}
+        df, error = _read_csv_upload(content)
+        if error:
+            return {"error": error}
+        PARSE_SECONDS.observe(time.perf_counter() - t_parse, 'predict_csv')
 
         # Check if model is loaded
         if model is None:
             return {"error": "AI model not loaded. Please ensure model files are available."}
 
-        print(f"Processing {len(df)} candidates for prediction")
+        logger.info("Scoring candidates", extra={'fields': {'rows': len(df), 'filename': file.filename}})
 
+        timings = {}
+        scored = _score_dataframe(df, timings)
         outputs = []
-
-        for idx, row in df.iterrows():
-            try:
-                # Extract catalog features for prediction
-                features = extract_catalog_features(row)
-                x = torch.tensor(features[np.newaxis, :], dtype=torch.float32).to(device)
-
-                with torch.no_grad():
-                    logits = model(x)
-                    prob = torch.softmax(logits, dim=1)[:,1].cpu().item()
-
-                outputs.append({
-                    'id': str(row.get('kepid', f'candidate_{idx}')),
-                    'prob_planet': float(prob)
-                })
-
-            except Exception as e:
-                print(f"Error processing row {idx}: {str(e)}")
+        row_errors = SampledErrors(logger)
+        for idx, row_id, prob, error in zip(df.index, scored['id'], scored['prob_planet'], scored['error']):
+            if error is None:
+                outputs.append({'id': row_id, 'prob_planet': float(prob)})
+            else:
+                row_errors.error("Error processing row", row=idx, error=error)
+                ROW_ERRORS.inc('predict_csv')
                 # Add error entry but continue processing
-                outputs.append({
-                    'id': str(row.get('kepid', f'candidate_{idx}')),
-                    'error': str(e)
-                })
+                outputs.append({'id': row_id, 'error': error})
 
+        row_errors.summary("Rows failed during scoring", rows=len(df))
+        FEATURE_SECONDS.observe(timings['features'], 'predict_csv')
+        INFERENCE_SECONDS.observe(timings['inference'], 'predict_csv')
+        ROWS_PER_REQUEST.observe(len(df), 'predict_csv')
         return {'predictions': outputs}
 
     except Exception as e:
-        print(f"File reading error: {e}")
+        logger.warning("File reading error", extra={'fields': {'error': str(e)}})
         return {"error": f"Could not read file: {str(e)}"}
 
-# WebSocket connection manager for real-time updates
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+def _embed_matrix(X):
+    """Penultimate-layer embeddings for a feature matrix, in batches"""
+    out = np.empty((len(X), model.embedding_dim), dtype=np.float32)
+    with torch.no_grad(), autocast(device, PRECISION):
+        for i in range(0, len(X), EMBED_BATCH_SIZE):
+            x = torch.from_numpy(np.ascontiguousarray(X[i:i+EMBED_BATCH_SIZE], dtype=np.float32)).to(device)
+            out[i:i+EMBED_BATCH_SIZE] = model.embed(x).float().cpu().numpy()
+    return out
+
+@app.post("/embed_csv")
+async def embed_csv(file: UploadFile = File(...), format: str = 'json'):
+    """Model embeddings (catalog_net output) for every candidate in an uploaded CSV.
+
+    Rows with missing, non-numeric or out-of-range features are not embedded.
+    format=npy returns the float32 matrix as a .npy file, one row per
+    candidate in upload order, with NaN rows for the invalid candidates;
+    format=json pairs each embedded row with its id and lists the invalid
+    ones under `errors`.
+    """
+    if model is None:
+        return {"error": "AI model not loaded. Please ensure model files are available."}
+    try:
+        df, error = _read_csv_upload(await file.read())
+        if error:
+            return {"error": error}
+        X, invalid = catalog_feature_matrix(df, return_invalid=True)
+        embeddings = np.full((len(X), model.embedding_dim), np.nan, dtype=np.float32)
+        if not invalid.all():
+            embeddings[~invalid] = _embed_matrix(X[~invalid])
+    except Exception as e:
+        logger.warning("Embedding failed", extra={'fields': {'error': str(e)}})
+        return {"error": f"Could not embed file: {str(e)}"}
+    if invalid.any():
+        ROW_ERRORS.inc('embed_csv', amount=int(invalid.sum()))
+    if format == 'npy':
+        buf = io.BytesIO()
+        np.save(buf, embeddings)
+        return Response(content=buf.getvalue(), media_type='application/octet-stream')
+    ids = [str(v) for v in df['kepid']]
+    return {'dim': int(embeddings.shape[1]),
+            'embeddings': [{'id': i, 'embedding': e.tolist()} for i, e, bad in zip(ids, embeddings, invalid) if not bad],
+            'errors': [{'id': i, 'error': INVALID_FEATURES_ERROR} for i, bad in zip(ids, invalid) if bad]}
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# WebSocket connection manager for real-time updates
+WS_QUEUE_SIZE = int(os.environ.get('WS_QUEUE_SIZE', '64'))
+WS_RATE_LIMIT = float(os.environ.get('WS_RATE_LIMIT', '2000'))  # candidate rows/sec across all connections, 0 disables
+WS_BURST = int(os.environ.get('WS_BURST', '256'))
+WS_MAX_IN_FLIGHT = int(os.environ.get('WS_MAX_IN_FLIGHT', '8'))
+DETECTION_TOPIC = 'detections'
+DETECTION_THRESHOLD = 0.5
+
+manager = ConnectionManager(queue_size=WS_QUEUE_SIZE, rate_limit=WS_RATE_LIMIT,
+                            burst=WS_BURST, max_in_flight=WS_MAX_IN_FLIGHT)
+WS_CONNECTIONS.set_function(lambda: len(manager.active_connections))
+TORCH_THREADS.set_function(torch.get_num_threads)
+
+def _predict_pipelined(X):
+    with INFERENCE_SECONDS.time('ws'):
+        ROWS_PER_REQUEST.observe(len(X), 'ws')
+        return _predict_probs(X)
+
+# pipelined /ws requests in flight across all connections share forward passes
+inference_batcher = InferenceBatcher(_predict_pipelined)
+
+async def _answer_pipelined(websocket, candidate_data, client_request_id):
+    """Score one pipelined /ws message off the receive loop and reply with its request_id"""
+    try:
+        with FEATURE_SECONDS.time('ws'):
+            features = extract_websocket_features(candidate_data)
+        prob = await inference_batcher.predict(features)
+        result = {'request_id': client_request_id, 'id': candidate_data.get('id', 'unknown'),
+                  'prob_planet': prob, 'status': 'success'}
+    except Exception as e:
+        result = {'request_id': client_request_id, 'status': 'error', 'message': str(e)}
+        REQUEST_ERRORS.inc('ws')
+    finally:
+        manager.release(websocket)
+    await manager.send_personal_message(json.dumps(result), websocket)
+    WS_MESSAGES.inc('ws', 'sent')
+    if result['status'] == 'success':
+        await publish_detections([result], 'ws')
 
-manager = ConnectionManager()
+@app.on_event("shutdown")
+async def _close_inference_batcher():
+    await inference_batcher.close()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    request_id_var.set(new_request_id())
     await manager.connect(websocket)
+    pipelined = set()
     try:
         while True:
-            # Receive data from client
+            # Receive data from client, once it has read enough of our replies
+            await manager.wait_writable(websocket)
             data = await websocket.receive_text()
+            WS_MESSAGES.inc('ws', 'received')
 
             # Parse the received data
+            admitted = False
             try:
                 json_data = json.loads(data)
                 candidate_data = json_data.get('candidate', {})
 
+                client_request_id = json_data.get('request_id')
+
+                slow_down = manager.admit(websocket)
+                if slow_down is not None:
+                    slow_down['id'] = candidate_data.get('id', 'unknown')
+                    if client_request_id is not None:
+                        slow_down['request_id'] = client_request_id
+                    await manager.send_personal_message(json.dumps(slow_down), websocket)
+                    WS_MESSAGES.inc('ws', 'sent')
+                    continue
+                admitted = True
+
+                # Pipelined mode: messages carrying a request_id are scored concurrently
+                # and answered as they finish, possibly out of order; the loop goes
+                # straight back to receiving. Messages without one keep strict
+                # request/response order.
+                if client_request_id is not None and model is not None:
+                    admitted = False  # released by the task
+                    task = asyncio.create_task(_answer_pipelined(websocket, candidate_data, client_request_id))
+                    pipelined.add(task)
+                    task.add_done_callback(pipelined.discard)
+                    continue
+
                 # Check if model is loaded
                 if model is None:
                     error_result = {
@@ -269,16 +601,16 @@ async def websocket_endpoint(websocket: WebSocket):
                         'message': 'AI model not loaded'
                     }
                     await manager.send_personal_message(json.dumps(error_result), websocket)
+                    WS_MESSAGES.inc('ws', 'sent')
                     continue
 
                 # Extract features for prediction
-                features = extract_websocket_features(candidate_data)
+                with FEATURE_SECONDS.time('ws'):
+                    features = extract_websocket_features(candidate_data)
 
                 # Make prediction
-                x = torch.tensor(features[np.newaxis, :], dtype=torch.float32).to(device)
-                with torch.no_grad():
-                    logits = model(x)
-                    prob = torch.softmax(logits, dim=1)[:,1].cpu().item()
+                with INFERENCE_SECONDS.time('ws'):
+                    prob = _predict_probs(features[np.newaxis, :])[0]
 
                 # Send result back
                 result = {
@@ -288,6 +620,8 @@ async def websocket_endpoint(websocket: WebSocket):
                 }
 
                 await manager.send_personal_message(json.dumps(result), websocket)
+                WS_MESSAGES.inc('ws', 'sent')
+                await publish_detections([result], 'ws')
 
             except Exception as e:
                 error_result = {
@@ -295,23 +629,45 @@ async def websocket_endpoint(websocket: WebSocket):
                     'message': str(e)
                 }
                 await manager.send_personal_message(json.dumps(error_result), websocket)
+                WS_MESSAGES.inc('ws', 'sent')
+                REQUEST_ERRORS.inc('ws')
+            finally:
+                if admitted:
+                    manager.release(websocket)
 
     except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pipelined:
+            task.cancel()
         manager.disconnect(websocket)
 
 @app.websocket("/ws/stream")
 async def websocket_stream(websocket: WebSocket):
     """Streaming endpoint for continuous data"""
+    request_id_var.set(new_request_id())
     await manager.connect(websocket)
     try:
         while True:
-            # Receive streaming data
+            # Receive streaming data, once the client has read enough of our replies
+            await manager.wait_writable(websocket)
             data = await websocket.receive_text()
+            WS_MESSAGES.inc('ws_stream', 'received')
 
             # Process streaming data (could be light curve points, etc.)
+            admitted = False
             try:
                 json_data = json.loads(data)
 
+                # rate limited in candidate rows, so a 500-row batch costs 500 single messages
+                cost = len(json_data.get('candidates') or ()) if json_data.get('type') == 'batch_candidates' else 1
+                slow_down = manager.admit(websocket, max(cost, 1))
+                if slow_down is not None:
+                    await manager.send_personal_message(json.dumps(slow_down), websocket)
+                    WS_MESSAGES.inc('ws_stream', 'sent')
+                    continue
+                admitted = True
+
                 if json_data.get('type') == 'light_curve_point':
                     # Handle streaming light curve data
                     point = json_data.get('point', {})
@@ -321,32 +677,27 @@ async def websocket_stream(websocket: WebSocket):
                         'status': 'received'
                     }
                     await manager.send_personal_message(json.dumps(result), websocket)
+                    WS_MESSAGES.inc('ws_stream', 'sent')
 
                 elif json_data.get('type') == 'batch_candidates':
                     # Handle batch of candidates for real-time processing
                     candidates = json_data.get('candidates', [])
 
-                    results = []
-                    for candidate in candidates:
-                        # Check if model is loaded
-                        if model is None:
-                            results.append({
-                                'id': candidate.get('id', 'unknown'),
-                                'error': 'AI model not loaded'
-                            })
-                            continue
-
-                        features = extract_websocket_features(candidate)
-                        x = torch.tensor(features[np.newaxis, :], dtype=torch.float32).to(device)
-
-                        with torch.no_grad():
-                            logits = model(x)
-                            prob = torch.softmax(logits, dim=1)[:,1].cpu().item()
-
-                        results.append({
-                            'id': candidate.get('id', 'unknown'),
-                            'prob_planet': float(prob)
-                        })
+                    ids = [candidate.get('id', 'unknown') for candidate in candidates]
+                    if model is None:
+                        results = [{'id': i, 'error': 'AI model not loaded'} for i in ids]
+                    else:
+                        # one feature matrix and one forward pass for the whole batch
+                        t0 = time.perf_counter()
+                        X, invalid = catalog_feature_matrix(candidates, return_invalid=True, require=False)
+                        t1 = time.perf_counter()
+                        probs = _predict_probs(X)
+                        FEATURE_SECONDS.observe(t1 - t0, 'ws_stream')
+                        INFERENCE_SECONDS.observe(time.perf_counter() - t1, 'ws_stream')
+                        results = [{'id': i, 'error': INVALID_FEATURES_ERROR} if bad else {'id': i, 'prob_planet': float(p)}
+                                   for i, p, bad in zip(ids, probs, invalid)]
+
+                    ROWS_PER_REQUEST.observe(len(candidates), 'ws_stream')
 
                     # Send all results at once
                     response = {
@@ -356,6 +707,18 @@ async def websocket_stream(websocket: WebSocket):
                     }
 
                     await manager.send_personal_message(json.dumps(response), websocket)
+                    WS_MESSAGES.inc('ws_stream', 'sent')
+                    await publish_detections(results, 'ws_stream')
+
+                elif json_data.get('type') in ('subscribe', 'unsubscribe'):
+                    topics = json_data.get('topics') or [json_data.get('topic', DETECTION_TOPIC)]
+                    for topic in topics:
+                        if json_data['type'] == 'subscribe':
+                            manager.subscribe(websocket, str(topic))
+                        else:
+                            manager.unsubscribe(websocket, str(topic))
+                    await manager.send_personal_message(json.dumps({'type': json_data['type'] + 'd', 'topics': topics}), websocket)
+                    WS_MESSAGES.inc('ws_stream', 'sent')
 
             except Exception as e:
                 error_result = {
@@ -363,57 +726,98 @@ async def websocket_stream(websocket: WebSocket):
                     'message': str(e)
                 }
                 await manager.send_personal_message(json.dumps(error_result), websocket)
+                WS_MESSAGES.inc('ws_stream', 'sent')
+                REQUEST_ERRORS.inc('ws_stream')
+            finally:
+                if admitted:
+                    manager.release(websocket)
 
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
+async def publish_detections(results, source):
+    """Push likely planets to clients subscribed to the detections topic"""
+    for r in results:
+        if r.get('prob_planet', 0.0) >= DETECTION_THRESHOLD:
+            # coalesced per candidate id: a lagging dashboard gets the latest score, not a backlog
+            await manager.broadcast({'type': 'detection', 'id': r.get('id'), 'prob_planet': r['prob_planet'],
+                                     'source': source}, topic=DETECTION_TOPIC, coalesce_key=r.get('id'))
+
 def extract_websocket_features(candidate_data):
-    """Extract features from WebSocket data (similar to CSV processing)"""
-    features = []
-
-    # Basic orbital parameters
-    features.append(candidate_data.get('koi_period', 2.5))  # Period
-    features.append(candidate_data.get('koi_time0bk', 2458321.5))  # Transit time
-    features.append(candidate_data.get('koi_impact', 0))  # Impact parameter
-    features.append(candidate_data.get('koi_duration', 3.0))  # Transit duration
-    features.append(candidate_data.get('koi_depth', 100))  # Transit depth
-    features.append(candidate_data.get('koi_prad', 2.0))  # Planet radius
-    features.append(candidate_data.get('koi_teq', 600))  # Equilibrium temperature
-    features.append(candidate_data.get('koi_insol', 1.0))  # Insolation flux
-    features.append(candidate_data.get('koi_slogg', 4.4))  # Stellar surface gravity
-    features.append(candidate_data.get('koi_srad', 1.0))  # Stellar radius
-    features.append(candidate_data.get('koi_steff', 5700))  # Stellar effective temperature
-    features.append(candidate_data.get('koi_smass', 1.0))  # Stellar mass
-    features.append(candidate_data.get('koi_sage', 4.0))  # Stellar age
-
-    # Fill NaN values with defaults
-    features = [f if f != 0 else 0.1 for f in features]  # Avoid zero values
-
-    return np.array(features, dtype=np.float32)
-
-def extract_catalog_features(row):
-    """Extract relevant features from NASA catalog for ML model"""
-    features = []
-
-    # Basic orbital parameters
-    features.append(row['koi_period'])  # Period
-    features.append(row['koi_time0bk'])  # Transit time
-    features.append(row.get('koi_impact', 0))  # Impact parameter
-    features.append(row.get('koi_duration', 0))  # Transit duration
-    features.append(row.get('koi_depth', 0))  # Transit depth
-    features.append(row.get('koi_prad', 1))  # Planet radius (Earth radii)
-    features.append(row.get('koi_teq', 300))  # Equilibrium temperature
-    features.append(row.get('koi_insol', 1))  # Insolation flux
-    features.append(row.get('koi_slogg', 4.5))  # Stellar surface gravity
-    features.append(row.get('koi_srad', 1))  # Stellar radius
-    features.append(row.get('koi_steff', 5500))  # Stellar effective temperature
-    features.append(row.get('koi_smass', 1))  # Stellar mass
-    features.append(row.get('koi_sage', 4.5))  # Stellar age
-
-    # Fill NaN values with defaults
-    features = [f if not pd.isna(f) else 0 for f in features]
-
-    return np.array(features, dtype=np.float32)
+    """Feature vector for one WebSocket candidate; absent or null fields take the schema defaults"""
+    return catalog_feature_matrix([candidate_data], require=False)[0]
+
+def _read_csv_upload(content):
+    """Parse uploaded CSV bytes into a cleaned candidate dataframe; returns (df, error)"""
+    # Universal CSV parsing with intelligent column detection
+    df = None
+
+    # Try multiple parsing strategies; '#' lines are the NASA archive's comment header
+    parsing_strategies = [
+        # Strategy 1: Default pandas reading
+        lambda: pd.read_csv(io.BytesIO(content), comment='#'),
+
+        # Strategy 2: With flexible options
+        lambda: pd.read_csv(
+            io.BytesIO(content),
+            sep=',',
+            comment='#',
+            quotechar='"',
+            quoting=0,  # QUOTE_MINIMAL
+            escapechar='\\',
+            on_bad_lines='skip',
+            low_memory=False
+        ),
+
+        # Strategy 3: Try different separators
+        lambda: pd.read_csv(
+            io.BytesIO(content),
+            sep=None,
+            engine='python',
+            comment='#',
+            quoting=3,  # QUOTE_NONE
+            on_bad_lines='skip'
+        ),
+
+        # Strategy 4: Manual parsing for severely malformed files
+        lambda: _manual_csv_parse(content)
+    ]
+
+    for i, strategy in enumerate(parsing_strategies):
+        try:
+            df = strategy()
+            logger.debug("Parsed CSV", extra={'fields': {'strategy': i+1}})
+            break
+        except Exception as e:
+            logger.debug("CSV parse strategy failed", extra={'fields': {'strategy': i+1, 'error': str(e)}})
+            continue
+
+    if df is None:
+        return None, "Could not parse CSV file with any strategy"
+
+    # Clean the dataframe
+    df = _clean_dataframe(df)
+
+    if df is None:
+        return None, "Failed to parse CSV file"
+
+    # Handle various CSV formats with intelligent column detection
+    logger.debug("Detected columns", extra={'fields': {'columns': list(df.columns)}})
+
+    # Set default ID if not available
+    if 'kepid' not in df.columns:
+        df['kepid'] = [f"candidate_{i}" for i in range(len(df))]
+
+    # Ensure we have the required columns for prediction
+    required_cols = REQUIRED_FEATURES
+    missing_required = [col for col in required_cols if col not in df.columns]
+
+    if missing_required:
+        return None, f"Missing required columns for prediction: {missing_required}. Available columns: {list(df.columns)}"
+
+    return df, None
 
 def _manual_csv_parse(content):
     """Manually parse severely malformed CSV files"""
@@ -424,7 +828,7 @@ def _manual_csv_parse(content):
     valid_lines = []
     for line in lines:
         line = line.strip()
-        if line and len(line.split(',')) >= 3:  # At least 3 columns
+        if line and not line.startswith('#') and len(line.split(',')) >= 3:  # At least 3 columns
             valid_lines.append(line)
 
     if not valid_lines:
@@ -450,20 +854,24 @@ def _manual_csv_parse(content):
     finally:
         os.unlink(temp_file)
 
-def _clean_dataframe(df):
-    """Clean and standardize dataframe columns"""
+def _clean_dataframe(df, max_rows=1000):
+    """Clean and standardize dataframe columns; max_rows=None disables the row cap"""
     if df is None or df.empty:
         raise ValueError("Empty dataframe")
 
     # Remove completely empty columns
     df = df.dropna(axis=1, how='all')
+    return _apply_column_plan(df, _column_plan(df.columns), max_rows)
 
-    # Remove completely empty rows
-    df = df.dropna(axis=0, how='all')
+def _column_plan(columns):
+    """(rename map, fallback copies) for a CSV header.
 
+    Depends on column names only, so a file scored in chunks maps every
+    chunk the same way.
+    """
     # Standardize column names (case-insensitive matching)
     column_mapping = {}
-    for col in df.columns:
+    for col in columns:
         col_lower = str(col).lower().strip()
         if 'kepid' in col_lower or 'id' in col_lower:
             column_mapping[col] = 'kepid'
@@ -492,50 +900,46 @@ def _clean_dataframe(df):
         elif 'sage' in col_lower or 'age' in col_lower:
             column_mapping[col] = 'koi_sage'
 
-    # Rename columns
-    df = df.rename(columns=column_mapping)
+    # One source column per target: an exact name wins, otherwise the first match
+    # (NASA exports carry koi_period_err1/_err2 etc. next to koi_period)
+    taken = {str(col) for col in columns if column_mapping.get(col) == str(col)}
+    for col in list(column_mapping):
+        target = column_mapping[col]
+        if target == str(col):
+            continue
+        if target in taken:
+            del column_mapping[col]
+        else:
+            taken.add(target)
 
     # Ensure we have the minimum required columns
-    required_cols = ['koi_period', 'koi_time0bk']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-
+    cols = [column_mapping.get(col, col) for col in columns]
+    missing_cols = [col for col in REQUIRED_FEATURES if col not in cols]
+    fallbacks = []
     if missing_cols:
-        print(f"Warning: Missing required columns: {missing_cols}")
+        logger.warning("Missing required columns", extra={'fields': {'missing': missing_cols}})
         # Try to infer from available data
-        if len(df.columns) >= 2:
+        if len(cols) >= 2:
             # Use first column as ID, second as period, third as time
-            cols = df.columns.tolist()
-            if 'kepid' not in df.columns and len(cols) > 0:
-                df['kepid'] = df[cols[0]]
-            if 'koi_period' not in df.columns and len(cols) > 1:
-                df['koi_period'] = pd.to_numeric(df[cols[1]], errors='coerce')
-            if 'koi_time0bk' not in df.columns and len(cols) > 2:
-                df['koi_time0bk'] = pd.to_numeric(df[cols[2]], errors='coerce')
-
-    # Fill missing columns with defaults
-    default_values = {
-        'koi_depth': 100,
-        'koi_duration': 3.0,
-        'koi_prad': 2.0,
-        'koi_teq': 600,
-        'koi_insol': 1.0,
-        'koi_slogg': 4.4,
-        'koi_srad': 1.0,
-        'koi_steff': 5700,
-        'koi_smass': 1.0,
-        'koi_sage': 4.0
-    }
-
-    for col, default_val in default_values.items():
-        if col not in df.columns:
-            df[col] = default_val
-
-    # Convert data types
-    numeric_columns = ['koi_period', 'koi_time0bk', 'koi_depth', 'koi_duration',
-                      'koi_prad', 'koi_teq', 'koi_insol', 'koi_slogg',
-                      'koi_srad', 'koi_steff', 'koi_smass', 'koi_sage']
-
-    for col in numeric_columns:
+            for target, pos in (('kepid', 0), ('koi_period', 1), ('koi_time0bk', 2)):
+                if target not in cols and len(cols) > pos:
+                    fallbacks.append((target, cols[pos]))
+    return column_mapping, fallbacks
+
+def _apply_column_plan(df, plan, max_rows=None):
+    """Row-level cleaning of one frame or chunk under a plan from _column_plan"""
+    column_mapping, fallbacks = plan
+
+    # Remove completely empty rows
+    df = df.dropna(axis=0, how='all')
+
+    # Rename columns
+    df = df.rename(columns=column_mapping)
+    for target, source in fallbacks:
+        df[target] = df[source]
+
+    # Absent columns are filled with the shared schema defaults at feature extraction
+    for col in CATALOG_FEATURES:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
 
@@ -547,13 +951,14 @@ def _clean_dataframe(df):
         df = df[df['koi_time0bk'] > 0]
 
     # Limit to reasonable number of rows for processing
-    if len(df) > 1000:
-        print(f"Limiting processing to first 1000 rows out of {len(df)}")
-        df = df.head(1000)
+    if max_rows is not None and len(df) > max_rows:
+        logger.info("Limiting processing to first rows", extra={'fields': {'rows': len(df), 'limit': max_rows}})
+        df = df.head(max_rows)
 
     return df
 
 if __name__ == '__main__':
     # Get port from environment variable (for Render deployment) or use default
+    # (WEB_CONCURRENCY > 1 was handed to serve.py at the top)
     port = int(os.getenv('PORT', 8000))
     uvicorn.run(app, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,68 @@
+# benchmarks/asgi_client.py
+import asyncio
+import itertools
+
+_client_ports = itertools.count(40000)
+
+class Lifespan:
+    """Drive ASGI lifespan startup/shutdown so app startup hooks run in-process"""
+    def __init__(self, app):
+        self.app = app
+        self._in = asyncio.Queue()
+        self._out = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self):
+        scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}}
+        self._task = asyncio.create_task(self.app(scope, self._in.get, self._out.put))
+        await self._in.put({'type': 'lifespan.startup'})
+        msg = await self._out.get()
+        if msg['type'] != 'lifespan.startup.complete':
+            raise RuntimeError(f"Lifespan startup failed: {msg}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._in.put({'type': 'lifespan.shutdown'})
+        await self._out.get()
+        await self._task
+
+class WebSocketClient:
+    """Minimal in-process WebSocket client speaking ASGI directly to the app"""
+    def __init__(self, app, path, query_string=b''):
+        self.app = app
+        self.path = path
+        self.query_string = query_string
+        self._in = asyncio.Queue()
+        self._out = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self):
+        scope = {
+            'type': 'websocket', 'asgi': {'version': '3.0'}, 'scheme': 'ws',
+            'path': self.path, 'raw_path': self.path.encode(), 'root_path': '',
+            'query_string': self.query_string, 'headers': [(b'host', b'testserver')],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', next(_client_ports)),
+            'subprotocols': [],
+        }
+        self._task = asyncio.create_task(self.app(scope, self._in.get, self._out.put))
+        await self._in.put({'type': 'websocket.connect'})
+        msg = await self._out.get()
+        if msg['type'] != 'websocket.accept':
+            raise RuntimeError(f"WebSocket not accepted: {msg}")
+        return self
+
+    async def send_text(self, text):
+        await self._in.put({'type': 'websocket.receive', 'text': text})
+
+    async def receive_text(self):
+        msg = await self._out.get()
+        if msg['type'] != 'websocket.send':
+            raise RuntimeError(f"Connection closed by server: {msg}")
+        return msg['text']
+
+    async def __aexit__(self, *exc):
+        await self._in.put({'type': 'websocket.disconnect', 'code': 1000})
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
@@ -0,0 +1,181 @@
+# benchmarks/bench_api.py
+"""In-process benchmark of the prediction API hot paths.
+
+Drives /predict_csv with synthetic and bundled CSVs through httpx's ASGI
+transport, and /ws (lockstep and pipelined) and /ws/stream with concurrent
+simulated clients speaking ASGI directly, so no server process or network
+stack is involved. Reports rows/sec, p50/p95/p99 latency and peak RSS, and
+saves JSON to benchmarks/results/ tagged with the current commit.
+
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --quick
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import httpx
+
+from common import use_repo_root, latency_stats, save_results, print_table, peak_rss_mb
+from asgi_client import Lifespan, WebSocketClient
+
+REAL_CSVS = ['test_candidates.csv', 'cumulative_2025.10.05_06.00.17.csv']
+
+def synthetic_candidates(n, seed=0):
+    """Plausible catalog rows covering all 13 model features"""
+    rng = np.random.default_rng(seed)
+    return {
+        'kepid': np.arange(1000000, 1000000 + n),
+        'koi_period': rng.lognormal(2.0, 1.2, n),
+        'koi_time0bk': rng.uniform(130, 600, n),
+        'koi_impact': rng.uniform(0, 1.2, n),
+        'koi_duration': rng.lognormal(1.2, 0.5, n),
+        'koi_depth': rng.lognormal(6.0, 1.5, n),
+        'koi_prad': rng.lognormal(0.8, 0.9, n),
+        'koi_teq': rng.normal(900, 300, n).clip(100),
+        'koi_insol': rng.lognormal(4.0, 2.0, n),
+        'koi_slogg': rng.normal(4.4, 0.2, n),
+        'koi_srad': rng.lognormal(0.0, 0.3, n),
+        'koi_steff': rng.normal(5600, 600, n),
+        'koi_smass': rng.lognormal(0.0, 0.2, n),
+        'koi_sage': rng.uniform(0.5, 10, n),
+    }
+
+def synthetic_csv(n, seed=0):
+    cols = synthetic_candidates(n, seed)
+    names = list(cols)
+    lines = [','.join(names)]
+    for i in range(n):
+        lines.append(','.join(f'{cols[c][i]:.6g}' if c != 'kepid' else str(cols[c][i]) for c in names))
+    return ('\n'.join(lines) + '\n').encode()
+
+def candidate_dicts(n, seed=0):
+    cols = synthetic_candidates(n, seed)
+    return [{c: (float(v[i]) if c != 'kepid' else int(v[i])) for c, v in cols.items()} | {'id': f'c{i}'}
+            for i in range(n)]
+
+async def bench_predict_csv(client, name, content, repeats):
+    latencies = []
+    rows = 0
+    errors = 0
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        t = time.perf_counter()
+        r = await client.post('/predict_csv', files={'file': (name, content, 'text/csv')})
+        latencies.append(time.perf_counter() - t)
+        body = r.json()
+        preds = body.get('predictions', [])
+        rows += len(preds)
+        errors += int('error' in body) + sum('error' in p for p in preds)
+    elapsed = time.perf_counter() - t0
+    return dict(scenario='predict_csv', input=name, bytes=len(content), requests=repeats,
+                rows=rows, errors=errors, rows_per_sec=rows / elapsed, **latency_stats(latencies))
+
+async def _ws_client(app, path, messages, latencies, counter):
+    async with WebSocketClient(app, path) as ws:
+        for payload, n_rows in messages:
+            t = time.perf_counter()
+            await ws.send_text(payload)
+            reply = await ws.receive_text()
+            latencies.append(time.perf_counter() - t)
+            if '"slow_down"' in reply:
+                counter[1] += 1
+            else:
+                counter[0] += n_rows
+
+async def bench_ws(app, path, clients, n_messages, batch):
+    cands = candidate_dicts(max(batch, n_messages))
+    if path == '/ws':
+        messages = [(json.dumps({'candidate': cands[i % len(cands)]}), 1) for i in range(n_messages)]
+    else:
+        payload = json.dumps({'type': 'batch_candidates', 'candidates': cands[:batch]})
+        messages = [(payload, batch)] * n_messages
+    latencies = []
+    counter = [0, 0]  # rows scored, messages throttled
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_ws_client(app, path, messages, latencies, counter) for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return dict(scenario=path, input=f'{clients} clients x {n_messages} msgs' + (f' x {batch} rows' if path != '/ws' else ''),
+                requests=len(latencies), rows=counter[0], throttled=counter[1], rows_per_sec=counter[0] / elapsed,
+                msgs_per_sec=len(latencies) / elapsed, **latency_stats(latencies))
+
+async def _ws_pipelined_client(app, n_messages, window, cands, latencies, counter):
+    """Keep up to `window` request_id-tagged candidates in flight on one /ws connection"""
+    async with WebSocketClient(app, '/ws') as ws:
+        sent_at = {}
+        next_id = 0
+        while next_id < n_messages or sent_at:
+            while next_id < n_messages and len(sent_at) < window:
+                sent_at[next_id] = time.perf_counter()
+                await ws.send_text(json.dumps({'request_id': next_id, 'candidate': cands[next_id % len(cands)]}))
+                next_id += 1
+            reply = json.loads(await ws.receive_text())
+            latencies.append(time.perf_counter() - sent_at.pop(reply['request_id']))
+            if reply.get('type') == 'slow_down':
+                counter[1] += 1
+            else:
+                counter[0] += 1
+
+async def bench_ws_pipelined(app, clients, n_messages, window):
+    cands = candidate_dicts(n_messages)
+    latencies = []
+    counter = [0, 0]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_ws_pipelined_client(app, n_messages, window, cands, latencies, counter) for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return dict(scenario='/ws pipelined', input=f'{clients} clients x {n_messages} msgs, window {window}',
+                requests=len(latencies), rows=counter[0], throttled=counter[1], rows_per_sec=counter[0] / elapsed,
+                msgs_per_sec=len(latencies) / elapsed, **latency_stats(latencies))
+
+async def run(args):
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')  # keep per-request log lines out of the timings
+    os.environ.setdefault('WS_RATE_LIMIT', '0')  # measure capacity, not the configured limit
+    import api_predict
+    app = api_predict.app
+    results = []
+    async with Lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver', timeout=None) as client:
+            # warm-up: first request pays for lazy imports and allocator growth
+            await client.post('/predict_csv', files={'file': ('warmup.csv', synthetic_csv(10), 'text/csv')})
+            for n in args.sizes:
+                results.append(await bench_predict_csv(client, f'synthetic_{n}.csv', synthetic_csv(n, seed=n), args.repeats))
+            for path in REAL_CSVS:
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        result = await bench_predict_csv(client, path, f.read(), args.repeats)
+                    # a file the endpoint rejects would only time the error path
+                    if result['errors'] or not result['rows']:
+                        raise SystemExit(f"{path}: {result['rows']} rows scored with {result['errors']} errors; "
+                                         "fix the input or the parser before benchmarking it")
+                    results.append(result)
+        for clients in args.clients:
+            results.append(await bench_ws(app, '/ws', clients, args.messages, 1))
+            results.append(await bench_ws_pipelined(app, clients, args.messages, args.window))
+            results.append(await bench_ws(app, '/ws/stream', clients, args.messages, args.batch))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Synthetic CSV row counts')
+    parser.add_argument('--repeats', type=int, default=5, help='Requests per CSV input')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32], help='Concurrent WebSocket clients')
+    parser.add_argument('--messages', type=int, default=50, help='Messages per WebSocket client')
+    parser.add_argument('--window', type=int, default=8, help='In-flight requests per pipelined /ws client')
+    parser.add_argument('--batch', type=int, default=32, help='Candidates per /ws/stream batch message')
+    parser.add_argument('--quick', action='store_true', help='Small sizes for a smoke run')
+    parser.add_argument('--out-dir', default=None)
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.repeats, args.clients, args.messages = [100], 2, [1, 4], 10
+
+    use_repo_root()
+    results = asyncio.run(run(args))
+    print_table(results, ['scenario', 'input', 'requests', 'rows', 'errors', 'throttled', 'rows_per_sec', 'p50_ms', 'p95_ms', 'p99_ms'])
+    print(f"peak RSS {peak_rss_mb():.1f} MB")
+    print("Saved:", save_results('api', results, args, args.out_dir))
+
+if __name__ == '__main__':
+    main()
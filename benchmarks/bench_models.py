@@ -0,0 +1,126 @@
+# benchmarks/bench_models.py
+"""Forward-pass micro-benchmarks for the models in models.py.
+
+Times the catalog MLP, TimeCNN, SimpleTransformer and the combined
+CNN + Transformer FullModel across batch sizes and torch thread counts, in
+eager, TorchScript and dynamically quantized (int8 Linear) form. Records
+throughput, latency percentiles, serialized model size and RSS growth, and
+saves JSON to benchmarks/results/ so regressions in models.py show up as
+diffs between commits.
+
+    python benchmarks/bench_models.py
+    python benchmarks/bench_models.py --models catalog --batch-sizes 1 64 --threads 1
+    python benchmarks/bench_models.py --models transformer --modes eager --seq-len 201 1000 4000
+"""
+import argparse
+import io
+import time
+import torch
+import torch.nn as nn
+
+from common import use_repo_root, latency_stats, save_results, print_table, current_rss_mb
+
+use_repo_root()
+from models import FullModel, TimeCNN, SimpleTransformer
+
+N_CATALOG_FEATURES = 13
+
+def build(name, seq_len):
+    """(module, input factory) for a benchmarked variant"""
+    if name == 'catalog':
+        return FullModel(seq_len=seq_len, n_tab_features=N_CATALOG_FEATURES, catalog_only=True), \
+            lambda b: torch.randn(b, N_CATALOG_FEATURES)
+    if name == 'cnn':
+        return TimeCNN(seq_len), lambda b: torch.randn(b, 1, seq_len)
+    if name == 'transformer':
+        return SimpleTransformer(seq_len), lambda b: torch.randn(b, 1, seq_len)
+    if name == 'combined':
+        return FullModel(seq_len=seq_len), lambda b: torch.randn(b, 1, seq_len)
+    raise ValueError(f"Unknown model {name}")
+
+def convert(model, mode, example):
+    """Eager, TorchScript (script, falling back to trace) or int8 dynamic-quantized copy"""
+    model = model.eval()
+    if mode == 'eager':
+        return model, 'eager'
+    if mode == 'scripted':
+        try:
+            return torch.jit.freeze(torch.jit.script(model)), 'script'
+        except Exception:
+            with torch.no_grad():
+                return torch.jit.freeze(torch.jit.trace(model, example)), 'trace'
+    if mode == 'quantized':
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8), 'dynamic-int8'
+    raise ValueError(f"Unknown mode {mode}")
+
+def model_size_mb(model):
+    buf = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buf)
+    else:
+        torch.save(model.state_dict(), buf)
+    return buf.tell() / (1024 * 1024)
+
+def time_forward(model, x, min_time, min_iters):
+    with torch.inference_mode():
+        for _ in range(3):  # warm-up (also triggers TorchScript profiling passes)
+            model(x)
+        latencies = []
+        start = time.perf_counter()
+        while len(latencies) < min_iters or time.perf_counter() - start < min_time:
+            t = time.perf_counter()
+            model(x)
+            latencies.append(time.perf_counter() - t)
+    return latencies
+
+def run(args):
+    results = []
+    default_threads = torch.get_num_threads()
+    for name, seq_len in ((n, s) for n in args.models for s in args.seq_len):
+        for mode in args.modes:
+            torch.manual_seed(0)
+            base, make_input = build(name, seq_len)
+            rss_before = current_rss_mb()
+            try:
+                model, how = convert(base, mode, make_input(max(args.batch_sizes)))
+                with torch.inference_mode():
+                    model(make_input(1))  # some conversions only fail at call time
+            except Exception as e:
+                results.append(dict(model=name, seq_len=seq_len, mode=mode, error=str(e)))
+                print(f"skip {name}/{mode}: {e}")
+                continue
+            size_mb = model_size_mb(model)
+            for threads in args.threads:
+                torch.set_num_threads(threads or default_threads)
+                for batch in args.batch_sizes:
+                    x = make_input(batch)
+                    latencies = time_forward(model, x, args.min_time, args.min_iters)
+                    stats = latency_stats(latencies)
+                    results.append(dict(
+                        model=name, seq_len=seq_len, mode=mode, how=how, threads=torch.get_num_threads(), batch=batch,
+                        samples_per_sec=batch * len(latencies) / sum(latencies),
+                        model_mb=size_mb, rss_growth_mb=current_rss_mb() - rss_before, **stats))
+    torch.set_num_threads(default_threads)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', default=['catalog', 'cnn', 'transformer', 'combined'],
+                        choices=['catalog', 'cnn', 'transformer', 'combined'])
+    parser.add_argument('--modes', nargs='+', default=['eager', 'scripted', 'quantized'],
+                        choices=['eager', 'scripted', 'quantized'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64, 256])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 0], help='torch intra-op threads (0 = default)')
+    parser.add_argument('--seq-len', type=int, nargs='+', default=[201], help='Light-curve lengths to sweep')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to time each configuration')
+    parser.add_argument('--min-iters', type=int, default=10)
+    parser.add_argument('--out-dir', default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print_table([r for r in results if 'error' not in r],
+                ['model', 'seq_len', 'mode', 'threads', 'batch', 'samples_per_sec', 'p50_ms', 'p99_ms', 'model_mb', 'rss_growth_mb'])
+    print("Saved:", save_results('models', results, args, args.out_dir))
+
+if __name__ == '__main__':
+    main()
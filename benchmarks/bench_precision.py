@@ -0,0 +1,161 @@
+# benchmarks/bench_precision.py
+"""bfloat16 vs fp32 on CPU: accuracy on nasa_dataset.npz and model throughput.
+
+Accuracy: scores the whole catalog dataset with the served nasa_model.pth
+in both precisions (PR-AUC, ROC-AUC, largest probability change and
+decisions flipped at 0.5), and optionally trains the catalog model for a
+few epochs in each precision on the train.py split. Throughput: inference
+and training-step samples/sec for the catalog MLP, TimeCNN,
+SimpleTransformer and the combined model. Saves JSON to benchmarks/results/.
+
+    python benchmarks/bench_precision.py
+    python benchmarks/bench_precision.py --train-epochs 0 --models cnn transformer
+"""
+import argparse
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+
+from common import use_repo_root, save_results, print_table
+from bench_models import build, time_forward
+
+use_repo_root()
+from models import FullModel
+from eval_metrics import StreamingBinaryMetrics
+from precision import PRECISIONS, bf16_supported, autocast
+
+DEVICE = torch.device('cpu')
+
+def _under(model, precision):
+    def call(x):
+        with autocast(DEVICE, precision):
+            return model(x)
+    return call
+
+def _scores(model, X, precision, batch_size=4096):
+    probs = np.empty(len(X), dtype=np.float32)
+    with torch.no_grad(), autocast(DEVICE, precision):
+        for i in range(0, len(X), batch_size):
+            logits = model(torch.from_numpy(X[i:i+batch_size]))
+            probs[i:i+batch_size] = torch.softmax(logits.float(), dim=1)[:, 1].numpy()
+    return probs
+
+def _metrics(y, p):
+    m = StreamingBinaryMetrics()
+    m.update(y, p)
+    return m.compute()
+
+def served_model_accuracy(npz, model_path):
+    data = np.load(npz, allow_pickle=True)
+    X, y = data['X'].astype(np.float32), data['y']
+    model = FullModel(seq_len=X.shape[1], n_tab_features=X.shape[1], catalog_only=True)
+    model.load_state_dict(torch.load(model_path, map_location=DEVICE))
+    model.eval()
+    p = {prec: _scores(model, X, prec) for prec in PRECISIONS}
+    rows = []
+    for prec in PRECISIONS:
+        s = _metrics(y, p[prec])
+        rows.append(dict(check='served_model', precision=prec, n=len(y), pr_auc=s['pr_auc'], roc_auc=s['roc_auc'],
+                         max_abs_dprob=float(np.abs(p[prec] - p['fp32']).max()),
+                         flipped=int(((p[prec] >= 0.5) != (p['fp32'] >= 0.5)).sum())))
+    return rows
+
+def training_accuracy(npz, epochs):
+    """Same seed, split and normalization as train.py; one short run per precision"""
+    from sklearn.model_selection import train_test_split
+    from torch.utils.data import DataLoader
+    from train import CatalogDataset, train_epoch, eval_model
+    from normalization import fit_input_norm, apply_input_norm
+    data = np.load(npz, allow_pickle=True)
+    X, y = data['X'], data['y']
+    train_idx, val_idx = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+    X = apply_input_norm(X, fit_input_norm(X[train_idx]))
+    counts = np.bincount(y[train_idx])
+    weights = torch.tensor(len(train_idx) / (2 * counts), dtype=torch.float32)
+    rows = []
+    for prec in PRECISIONS:
+        torch.manual_seed(0)
+        train_loader = DataLoader(CatalogDataset(X, y, train_idx), batch_size=64, shuffle=True)
+        val_loader = DataLoader(CatalogDataset(X, y, val_idx), batch_size=128)
+        model = FullModel(seq_len=X.shape[1], n_tab_features=X.shape[1], catalog_only=True)
+        opt = torch.optim.AdamW(model.parameters(), lr=1e-3, weight_decay=1e-5)
+        t0 = time.perf_counter()
+        for _ in range(epochs):
+            train_epoch(model, train_loader, opt, None, DEVICE, nn.CrossEntropyLoss(weight=weights), precision=prec)
+        elapsed = time.perf_counter() - t0
+        s = eval_model(model, val_loader, DEVICE, precision=prec)
+        rows.append(dict(check=f'train_{epochs}_epochs', precision=prec, n=s['n'], pr_auc=s['pr_auc'],
+                         roc_auc=s['roc_auc'], f1=s['f1'], train_sec=elapsed))
+    return rows
+
+def throughput(names, batch_sizes, train_batch, seq_len, min_time, min_iters):
+    rows = []
+    for name in names:
+        torch.manual_seed(0)
+        model, make_input = build(name, seq_len)
+        model.eval()
+        base = {}
+        for batch in batch_sizes:
+            x = make_input(batch)
+            for prec in PRECISIONS:
+                lat = time_forward(_under(model, prec), x, min_time, min_iters)
+                sps = batch * len(lat) / sum(lat)
+                base.setdefault(batch, sps)
+                rows.append(dict(model=name, phase='inference', batch=batch, precision=prec,
+                                 samples_per_sec=sps, speedup=sps / base[batch]))
+        # training step: forward + backward + AdamW update
+        x = make_input(train_batch)
+        target = torch.randint(0, 2, (train_batch,))
+        head = nn.Identity() if isinstance(model, FullModel) else nn.LazyLinear(2)
+        train_model = nn.Sequential(model, head).train()
+        train_model(x)  # materialize the lazy head before building the optimizer
+        opt = torch.optim.AdamW(train_model.parameters(), lr=1e-4)
+        base_sps = None
+        for prec in PRECISIONS:
+            def step():
+                opt.zero_grad()
+                with autocast(DEVICE, prec):
+                    loss = nn.functional.cross_entropy(train_model(x).float(), target)
+                loss.backward()
+                opt.step()
+            for _ in range(2):
+                step()
+            n, start = 0, time.perf_counter()
+            while n < min_iters or time.perf_counter() - start < min_time:
+                step()
+                n += 1
+            sps = train_batch * n / (time.perf_counter() - start)
+            base_sps = base_sps or sps
+            rows.append(dict(model=name, phase='train_step', batch=train_batch, precision=prec,
+                             samples_per_sec=sps, speedup=sps / base_sps))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--npz', default='nasa_dataset.npz')
+    parser.add_argument('--model', default='nasa_model.pth')
+    parser.add_argument('--train-epochs', type=int, default=3, help='Short catalog training run per precision (0 skips)')
+    parser.add_argument('--models', nargs='+', default=['catalog', 'cnn', 'transformer', 'combined'],
+                        choices=['catalog', 'cnn', 'transformer', 'combined'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 256])
+    parser.add_argument('--train-batch', type=int, default=64)
+    parser.add_argument('--seq-len', type=int, default=201)
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to time each configuration')
+    parser.add_argument('--min-iters', type=int, default=10)
+    parser.add_argument('--out-dir', default=None)
+    args = parser.parse_args()
+
+    print(f"native bf16 kernels: {bf16_supported(DEVICE)}, threads: {torch.get_num_threads()}")
+    accuracy = served_model_accuracy(args.npz, args.model)
+    if args.train_epochs:
+        accuracy += training_accuracy(args.npz, args.train_epochs)
+    print_table(accuracy, ['check', 'precision', 'n', 'pr_auc', 'roc_auc', 'f1', 'max_abs_dprob', 'flipped', 'train_sec'])
+    speed = throughput(args.models, args.batch_sizes, args.train_batch, args.seq_len, args.min_time, args.min_iters)
+    print()
+    print_table(speed, ['model', 'phase', 'batch', 'precision', 'samples_per_sec', 'speedup'])
+    results = dict(bf16_supported=bf16_supported(DEVICE), accuracy=accuracy, throughput=speed)
+    print("Saved:", save_results('precision', results, args, args.out_dir))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_preprocess.py
+"""Throughput of the offline light-curve pipeline on synthetic data.
+
+Generates transit light curves with synthetic_lc (no MAST access needed) for
+a few cadence / gap scenarios and times preprocess.detrend, preprocess.phase_fold,
+preprocess.phase_fold_views (global + local) and the full process_row per curve,
+plus batch throughput over the whole set.
+Saves JSON to benchmarks/results/.
+
+    python benchmarks/bench_preprocess.py
+    python benchmarks/bench_preprocess.py --curves 50 --baseline-days 30
+"""
+import argparse
+import time
+
+from common import use_repo_root, latency_stats, save_results, print_table
+
+use_repo_root()
+import preprocess
+from synthetic_lc import synthetic_dataset, KEPLER_LONG_CADENCE_MIN, KEPLER_SHORT_CADENCE_MIN, TESS_2MIN_CADENCE_MIN
+
+SCENARIOS = {
+    'kepler_long': dict(cadence_min=KEPLER_LONG_CADENCE_MIN, gaps='periodic', gap_every=90.0, gap_length=1.0),
+    'kepler_short': dict(cadence_min=KEPLER_SHORT_CADENCE_MIN, gaps='random'),
+    'tess_2min': dict(cadence_min=TESS_2MIN_CADENCE_MIN, gaps='periodic', gap_every=13.7, gap_length=1.0),
+}
+
+def bench_scenario(name, curves):
+    detrend_t, fold_t, views_t, row_t = [], [], [], []
+    points = sum(len(c['time']) for c in curves)
+    for c in curves:
+        t = time.perf_counter()
+        flux = preprocess.detrend(c['time'], c['flux'])
+        detrend_t.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        preprocess.phase_fold(c['time'], flux, c['period'], c['t0'])
+        fold_t.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        preprocess.phase_fold_views(c['time'], flux, c['period'], c['t0'])
+        views_t.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    for c in curves:
+        t = time.perf_counter()
+        preprocess.process_row(c)
+        row_t.append(time.perf_counter() - t)
+    batch_elapsed = time.perf_counter() - t0
+
+    out = []
+    for stage, lat in (('detrend', detrend_t), ('phase_fold', fold_t), ('fold_views', views_t), ('process_row', row_t)):
+        total = sum(lat)
+        out.append(dict(scenario=name, stage=stage, curves=len(curves), mean_points=points / len(curves),
+                        curves_per_sec=len(curves) / total, mpoints_per_sec=points / total / 1e6,
+                        **latency_stats(lat)))
+    out.append(dict(scenario=name, stage='batch', curves=len(curves), mean_points=points / len(curves),
+                    curves_per_sec=len(curves) / batch_elapsed, mpoints_per_sec=points / batch_elapsed / 1e6))
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--curves', type=int, default=200, help='Curves per scenario')
+    parser.add_argument('--baseline-days', type=float, default=90.0)
+    parser.add_argument('--noise-ppm', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out-dir', default=None)
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenarios:
+        curves = synthetic_dataset(args.curves, seed=args.seed, baseline_days=args.baseline_days,
+                                   noise_ppm=args.noise_ppm, **SCENARIOS[name])
+        results.extend(bench_scenario(name, curves))
+    print_table(results, ['scenario', 'stage', 'curves', 'mean_points', 'curves_per_sec', 'mpoints_per_sec', 'p50_ms', 'p99_ms'])
+    print("Saved:", save_results('preprocess', results, args, args.out_dir))
+
+if __name__ == '__main__':
+    main()
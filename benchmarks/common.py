@@ -0,0 +1,94 @@
+# benchmarks/common.py
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+def use_repo_root():
+    """Make repo modules importable and relative paths (model, data) resolve"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        commit = out.stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def current_rss_mb():
+    """Resident set size now (Linux /proc); falls back to the peak elsewhere"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def latency_stats(seconds):
+    """p50/p95/p99/mean/max in milliseconds"""
+    if len(seconds) == 0:
+        return {'n': 0}
+    ms = np.asarray(seconds) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'n': int(len(ms)), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+            'mean_ms': float(ms.mean()), 'max_ms': float(ms.max())}
+
+def environment():
+    import torch
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'numpy': np.__version__,
+    }
+
+def save_results(name, results, args, out_dir=None):
+    """Write results as JSON tagged with commit and environment; returns the path"""
+    out_dir = out_dir or RESULTS_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    commit = git_commit()
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    payload = {
+        'benchmark': name,
+        'commit': commit,
+        'timestamp': stamp,
+        'args': vars(args),
+        'environment': environment(),
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+    }
+    path = os.path.join(out_dir, f'{name}-{commit}-{stamp}.json')
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+def print_table(rows, columns):
+    widths = [max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print('  '.join(_fmt(r.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+def _fmt(v):
+    if isinstance(v, float):
+        return f'{v:.3f}' if abs(v) < 1000 else f'{v:.0f}'
+    return '' if v is None else str(v)
@@ -0,0 +1,134 @@
+# catalog_index.py
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import torch
+
+from features import FEATURE_SCHEMA_VERSION, catalog_feature_matrix
+from file_hash import file_sha256
+from precision import autocast, resolve_precision
+
+CATALOG_CSV = 'cumulative_2025.10.05_06.00.17.csv'
+INDEX_PATH = 'catalog_index.npy'
+
+INDEX_DTYPE = np.dtype([
+    ('kepid', '<i8'),
+    ('kepoi_name', 'S16'),
+    ('disposition', 'S16'),
+    ('prob_planet', '<f4'),
+])
+
+def meta_path(index_path):
+    return os.path.splitext(index_path)[0] + '.json'
+
+def is_stale(index_path, model_path, csv_path=CATALOG_CSV, precision='fp32'):
+    """True if the index is missing or was built from a different model, catalog file, feature schema or precision"""
+    if not (os.path.exists(index_path) and os.path.exists(meta_path(index_path))):
+        return True
+    with open(meta_path(index_path)) as f:
+        meta = json.load(f)
+    return (meta.get('model_sha256') != file_sha256(model_path) or meta.get('catalog_sha256') != file_sha256(csv_path)
+            or meta.get('feature_schema') != FEATURE_SCHEMA_VERSION or meta.get('precision', 'fp32') != precision)
+
+def score_catalog(model, df, device, batch_size=4096, precision='fp32'):
+    """Planet probability for every catalog row, scored in batches.
+
+    Pass the serving precision, so precomputed scores equal what live
+    scoring of the same row returns.
+    """
+    X = catalog_feature_matrix(df)
+    probs = np.empty(len(X), dtype=np.float32)
+    model.eval()
+    with torch.no_grad(), autocast(device, precision):
+        for i in range(0, len(X), batch_size):
+            x = torch.from_numpy(X[i:i+batch_size]).to(device)
+            probs[i:i+batch_size] = torch.softmax(model(x).float(), dim=1)[:,1].cpu().numpy()
+    return probs
+
+def build_index(model, model_path, device, csv_path=CATALOG_CSV, index_path=INDEX_PATH, precision='fp32'):
+    """Score the whole catalog and write a memory-mappable structured .npy plus JSON metadata"""
+    df = pd.read_csv(csv_path, comment='#')
+    probs = score_catalog(model, df, device, precision=precision)
+    index = np.zeros(len(df), dtype=INDEX_DTYPE)
+    index['kepid'] = df['kepid'].to_numpy(dtype=np.int64)
+    index['kepoi_name'] = df['kepoi_name'].fillna('').astype(str).str.encode('ascii')
+    index['disposition'] = df['koi_disposition'].fillna('').astype(str).str.encode('ascii')
+    index['prob_planet'] = probs
+
+    tmp = f'{index_path}.{os.getpid()}.tmp.npy'
+    np.save(tmp, index)
+    os.replace(tmp, index_path)
+    meta = {
+        'model_sha256': file_sha256(model_path),
+        'catalog_sha256': file_sha256(csv_path),
+        'feature_schema': FEATURE_SCHEMA_VERSION,
+        'precision': precision,
+        'rows': len(index),
+        'built': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    tmp = f'{meta_path(index_path)}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path(index_path))
+    return index
+
+def _record(row):
+    return {
+        'kepid': int(row['kepid']),
+        'kepoi_name': row['kepoi_name'].decode(),
+        'disposition': row['disposition'].decode(),
+        'prob_planet': float(row['prob_planet']),
+    }
+
+class CatalogIndex:
+    """Read-only view over a built index with O(1) lookup by kepid or kepoi_name.
+
+    The score table is memory-mapped; only the two key -> row hash maps live
+    on the Python heap.
+    """
+    def __init__(self, index_path=INDEX_PATH):
+        self.table = np.load(index_path, mmap_mode='r')
+        self.by_name = {name.decode(): i for i, name in enumerate(self.table['kepoi_name']) if name}
+        self.by_kepid = {}
+        for i, kepid in enumerate(self.table['kepid'].tolist()):
+            self.by_kepid.setdefault(kepid, []).append(i)
+        with open(meta_path(index_path)) as f:
+            self.meta = json.load(f)
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, key):
+        """All KOIs for a kepid (int or digit string), or the single KOI for a kepoi_name"""
+        key = str(key).strip()
+        if key in self.by_name:
+            rows = [self.by_name[key]]
+        else:
+            try:
+                rows = self.by_kepid.get(int(float(key)), [])
+            except (ValueError, OverflowError):  # not a number, or inf / 1e999
+                rows = []
+        return [_record(self.table[i]) for i in rows]
+
+if __name__ == '__main__':
+    import argparse
+    from models import FullModel
+    parser = argparse.ArgumentParser(description='Score the KOI catalog and write the prediction index')
+    parser.add_argument('--model', default='nasa_model.pth')
+    parser.add_argument('--csv', default=CATALOG_CSV)
+    parser.add_argument('--out', default=INDEX_PATH)
+    parser.add_argument('--precision', default=None, help='fp32 | bf16; match the server (default: TORCH_PRECISION or fp32)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the index is up to date')
+    args = parser.parse_args()
+    args.precision = resolve_precision(args.precision)
+    if not args.force and not is_stale(args.out, args.model, args.csv, args.precision):
+        print("Index up to date:", args.out)
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = FullModel(seq_len=201, n_tab_features=13, catalog_only=True)
+        model.load_state_dict(torch.load(args.model, map_location=device))
+        model.to(device)
+        index = build_index(model, args.model, device, args.csv, args.out, args.precision)
+        print("Saved:", args.out, "rows:", len(index))
@@ -0,0 +1,119 @@
+# checkpoint.py
+import os
+import random
+import threading
+import queue
+import numpy as np
+import torch
+
+def _to_cpu(obj):
+    # deep-copy tensors to CPU so the training loop can keep mutating the originals
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+def cpu_state_dict(model):
+    """CPU copy of model.state_dict(), safe to hand to AsyncCheckpointer"""
+    return _to_cpu(model.state_dict())
+
+def rng_state():
+    """Capture python, numpy and torch RNG states"""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state):
+    """Restore RNG states captured by rng_state()"""
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def training_state(model, opt, scheduler, scaler, epoch, **extra):
+    """Snapshot everything needed to resume training, copied to CPU"""
+    state = {
+        'model': model.state_dict(),
+        'optimizer': opt.state_dict(),
+        'scheduler': scheduler.state_dict(),
+        'scaler': scaler.state_dict() if scaler is not None else None,
+        'epoch': epoch,
+        'rng': rng_state(),
+    }
+    state.update(extra)
+    return _to_cpu(state)
+
+def load_training_state(path, model, opt, scheduler, scaler, device):
+    """Restore a checkpoint written by AsyncCheckpointer; returns the full state dict"""
+    # weights_only=False: the checkpoint holds numpy RNG state and python tuples.
+    # Loaded to CPU: RNG states must stay CPU ByteTensors, and load_state_dict
+    # copies the model and optimizer tensors onto the model's device itself.
+    state = torch.load(path, map_location='cpu', weights_only=False)
+    model.load_state_dict(state['model'])
+    opt.load_state_dict(state['optimizer'])
+    scheduler.load_state_dict(state['scheduler'])
+    if scaler is not None and state.get('scaler') is not None:
+        scaler.load_state_dict(state['scaler'])
+    set_rng_state(state['rng'])
+    return state
+
+class AsyncCheckpointer:
+    """Writes checkpoints from a background thread so training never blocks on disk.
+
+    The state is copied to CPU in the caller's thread (cheap compared to
+    serialization), then pickled and written by the worker. Files are written
+    to a temporary path and renamed, so a crash mid-write never leaves a
+    truncated checkpoint behind. Only the newest pending snapshot per path is
+    kept if the disk falls behind.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._errors = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def save(self, state, path):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("AsyncCheckpointer is closed")
+            self._pending[path] = state  # supersedes an older unwritten snapshot
+            self._cond.notify()
+        self._raise_errors()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                path, state = self._pending.popitem()
+            try:
+                tmp = path + '.tmp'
+                torch.save(state, tmp)
+                os.replace(tmp, path)
+            except Exception as e:
+                self._errors.put(e)
+
+    def _raise_errors(self):
+        if not self._errors.empty():
+            raise RuntimeError(f"Checkpoint write failed: {self._errors.get()}")
+
+    def close(self):
+        """Flush pending writes and stop the worker thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._raise_errors()
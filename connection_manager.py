@@ -0,0 +1,245 @@
+# connection_manager.py
+import asyncio
+import json
+import time
+from collections import deque
+
+from fastapi import WebSocket
+
+from serving_metrics import WS_DROPPED, WS_THROTTLED
+from structured_logging import get_logger
+
+logger = get_logger('ws')
+
+class _Outbox:
+    """Bounded per-connection send queue drained by its own sender task.
+
+    Broadcast messages are droppable: when the queue is full the oldest
+    droppable message is discarded, and a message published with a
+    `coalesce_key` replaces a still-unsent message with the same key (a
+    slow dashboard only ever sees the latest state). Personal messages
+    (request responses) are never dropped or coalesced; readers stop at
+    `maxsize` queued messages (see ConnectionManager.wait_writable), and a
+    client that still lets more than `max_replies` responses pile up is
+    disconnected.
+    """
+    def __init__(self, websocket, maxsize, on_dead, max_replies=None):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.max_replies = max_replies or 2 * maxsize
+        self.items = deque()   # [text, droppable, coalesce_key]
+        self.replies = 0       # non-droppable items in the queue
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._on_dead = on_dead
+        self._closer = None
+        self.task = asyncio.create_task(self._sender())
+
+    def put(self, text, droppable=False, coalesce_key=None):
+        if self.closed:
+            return
+        if not droppable and self.replies >= self.max_replies:
+            self._overflow()
+            return
+        if coalesce_key is not None:
+            for item in self.items:
+                if item[2] == coalesce_key:
+                    item[0] = text
+                    WS_DROPPED.inc('coalesced')
+                    return
+        if droppable and len(self.items) >= self.maxsize:
+            WS_DROPPED.inc('overflow')
+            for i, item in enumerate(self.items):
+                if item[1]:
+                    del self.items[i]
+                    break
+            else:
+                return  # queue is all responses; drop the new broadcast instead
+        self.items.append([text, droppable, coalesce_key])
+        self.replies += not droppable
+        self._ready.set()
+        if len(self.items) >= self.maxsize:
+            self._drained.clear()
+
+    async def drained(self):
+        await self._drained.wait()
+
+    def close(self):
+        """Stop sending and release anyone waiting in drained()"""
+        self.closed = True
+        self._drained.set()
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def _overflow(self):
+        logger.warning("WebSocket client not reading replies; disconnecting",
+                       extra={'fields': {'queued_replies': self.replies}})
+        WS_DROPPED.inc('reply_overflow')
+        self._on_dead(self.websocket)
+        self._closer = asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=1013)  # try again later
+        except Exception:
+            pass  # already gone
+
+    async def _sender(self):
+        try:
+            while True:
+                if not self.items:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                text, droppable, _ = self.items.popleft()
+                self.replies -= not droppable
+                if len(self.items) <= self.maxsize // 2:
+                    self._drained.set()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("WebSocket send failed; dropping connection", extra={'fields': {'error': str(e)}})
+            self.close()
+            self._on_dead(self.websocket)
+
+class TokenBucket:
+    """Token bucket refilled at `rate`/sec up to `burst`.
+
+    A request is admitted while the balance is positive and may overdraw it
+    (a 500-row batch against a 100-token burst goes through once, then the
+    connection waits off the debt), so large batches are never rejected
+    outright but still pay for every row.
+    """
+    def __init__(self, burst):
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def take(self, cost, rate):
+        """0.0 if admitted, else seconds until the balance is positive again"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        if self.tokens <= 0:
+            return -self.tokens / rate + 1e-3
+        self.tokens -= cost
+        return 0.0
+
+class _Limits:
+    def __init__(self, burst):
+        self.bucket = TokenBucket(burst)
+        self.in_flight = 0
+
+class ConnectionManager:
+    """WebSocket membership, personal replies and topic-based broadcast fan-out.
+
+    Connections live in a set (O(1) connect/disconnect). Each connection has
+    an _Outbox with its own sender task, so broadcast() only serializes the
+    message once and enqueues it; sends to different clients proceed
+    concurrently and one slow or broken client cannot stall the others.
+
+    Inbound work is limited per connection: `rate_limit` candidate rows/sec
+    are shared evenly between the open connections (each gets its own token
+    bucket refilled at rate_limit / connections), and at most
+    `max_in_flight` messages per connection are processed at once. Clients
+    over either limit get a `slow_down` frame instead of an answer.
+    """
+    def __init__(self, queue_size=64, rate_limit=0.0, burst=256, max_in_flight=8):
+        self.queue_size = queue_size
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.active_connections: set[WebSocket] = set()
+        self._outboxes = {}
+        self._limits = {}
+        self._topics = {}          # topic -> set of websockets
+        self._subscriptions = {}   # websocket -> set of topics
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.active_connections.add(websocket)
+        # readers stop at queue_size, so only replies already in flight can exceed it
+        self._outboxes[websocket] = _Outbox(websocket, self.queue_size, self.disconnect,
+                                            max_replies=self.queue_size + (self.max_in_flight or self.queue_size))
+        self._limits[websocket] = _Limits(self.burst)
+        self._subscriptions[websocket] = set()
+
+    def disconnect(self, websocket: WebSocket):
+        self.active_connections.discard(websocket)
+        self._limits.pop(websocket, None)
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()  # also wakes a reader blocked in wait_writable
+        for topic in self._subscriptions.pop(websocket, ()):
+            members = self._topics.get(topic)
+            if members is not None:
+                members.discard(websocket)
+                if not members:
+                    del self._topics[topic]
+
+    def subscribe(self, websocket: WebSocket, topic: str):
+        if websocket in self._subscriptions:
+            self._subscriptions[websocket].add(topic)
+            self._topics.setdefault(topic, set()).add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        self._subscriptions.get(websocket, set()).discard(topic)
+        members = self._topics.get(topic)
+        if members is not None:
+            members.discard(websocket)
+            if not members:
+                del self._topics[topic]
+
+    def queue_depth(self, websocket: WebSocket):
+        outbox = self._outboxes.get(websocket)
+        return len(outbox.items) if outbox is not None else 0
+
+    def admit(self, websocket: WebSocket, cost=1):
+        """None if the message may be processed (call release() when done), else a slow_down frame"""
+        limits = self._limits.get(websocket)
+        if limits is None:
+            return None
+        if self.max_in_flight and limits.in_flight >= self.max_in_flight:
+            return self._slow_down(websocket, 'in_flight', 0.0)
+        if self.rate_limit > 0:
+            retry_after = limits.bucket.take(cost, self.rate_limit / max(len(self.active_connections), 1))
+            if retry_after:
+                return self._slow_down(websocket, 'rate', retry_after)
+        limits.in_flight += 1
+        return None
+
+    def _slow_down(self, websocket, reason, retry_after):
+        WS_THROTTLED.inc(reason)
+        return {'type': 'slow_down', 'reason': reason, 'retry_after': round(retry_after, 3),
+                'in_flight': self._limits[websocket].in_flight, 'queue_depth': self.queue_depth(websocket)}
+
+    def release(self, websocket: WebSocket):
+        limits = self._limits.get(websocket)
+        if limits is not None:
+            limits.in_flight -= 1
+
+    async def wait_writable(self, websocket: WebSocket):
+        """Block while this client's unsent replies fill its queue; stops reading, so TCP pushes back"""
+        outbox = self._outboxes.get(websocket)
+        if outbox is not None:
+            await outbox.drained()
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        outbox = self._outboxes.get(websocket)
+        if outbox is not None:
+            outbox.put(message)
+
+    async def broadcast(self, message, topic=None, coalesce_key=None):
+        """Fan a message (str or JSON-serializable) out to every connection, or a topic's subscribers"""
+        targets = self.active_connections if topic is None else self._topics.get(topic, ())
+        if not targets:
+            return 0
+        text = message if isinstance(message, str) else json.dumps(message)
+        for websocket in list(targets):
+            outbox = self._outboxes.get(websocket)
+            if outbox is not None:
+                outbox.put(text, droppable=True, coalesce_key=coalesce_key)
+        return len(targets)
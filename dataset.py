@@ -1,7 +1,7 @@
 # dataset.py
 import numpy as np
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler
 import random
 
 def add_noise(x, scale=0.003):
@@ -13,18 +13,43 @@ def random_shift_phase(x, max_shift=5):
     return np.roll(x, s)
 
 class LC_Dataset(Dataset):
+    """Phase-folded light curves: fixed (N, L) or ragged (preprocess --variable-length).
+
+    Ragged files store the curves end to end in X with per-curve `lengths`;
+    batch them with LengthBucketSampler and pad_collate. Files with a
+    full-orbit global view (X_global) yield (x, y, {'x_global': g}), the
+    dict holding extra FullModel.forward arguments.
+    """
     def __init__(self, npzfile, indices=None, augment=False):
         data = np.load(npzfile, allow_pickle=True)
-        self.X = data['X']  # (N, L)
+        self.X = data['X']  # (N, L), or (sum(lengths),) when ragged
         self.y = data['y']
         self.augment = augment
+        self.X_global = data['X_global'] if 'X_global' in data else None  # (N, G)
+        self.global_len = self.X_global.shape[1] if self.X_global is not None else 0
+        self.variable_length = 'lengths' in data
+        if self.variable_length:
+            self.lengths = data['lengths']
+            self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]])
+        else:
+            self.lengths = np.full(len(self.X), self.X.shape[1], dtype=np.int64)
         if indices is not None:
-            self.X = self.X[indices]
+            if not self.variable_length:
+                self.X = self.X[indices]
+            else:
+                self.offsets = self.offsets[indices]
+            self.lengths = self.lengths[indices]
             self.y = self.y[indices]
+            if self.X_global is not None:
+                self.X_global = self.X_global[indices]
     def __len__(self):
-        return len(self.X)
+        return len(self.y)
     def __getitem__(self, idx):
-        x = self.X[idx].astype(np.float32)
+        if self.variable_length:
+            start = self.offsets[idx]
+            x = self.X[start:start + self.lengths[idx]].astype(np.float32)
+        else:
+            x = self.X[idx].astype(np.float32)
         if self.augment:
             if random.random() < 0.5:
                 x = add_noise(x, scale=0.002 + random.random()*0.004)
@@ -35,4 +60,58 @@ class LC_Dataset(Dataset):
                 i = np.random.randint(0, len(x)-10)
                 x[i:i+np.random.randint(3,10)] = 0
         x = np.expand_dims(x, 0)  # channel dim -> (1, L)
-        return torch.tensor(x, dtype=torch.float32), torch.tensor(self.y[idx], dtype=torch.long)
\ No newline at end of file
+        item = (torch.tensor(x, dtype=torch.float32), torch.tensor(self.y[idx], dtype=torch.long))
+        if self.X_global is None:
+            return item
+        g = self.X_global[idx].astype(np.float32)
+        if self.augment and random.random() < 0.5:
+            # shifts and masking are defined in local-view bins; the global view only gets noise
+            g = add_noise(g, scale=0.002 + random.random()*0.004)
+        return item + ({'x_global': torch.tensor(g[None], dtype=torch.float32)},)
+
+class LengthBucketSampler(Sampler):
+    """Batches of similar-length curves, so padding to the batch maximum wastes little.
+
+    Each epoch shuffles the indices, sorts windows of `bucket_batches` batches
+    by length, cuts them into batches and shuffles the batch order.
+    """
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_batches=50, drop_last=False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_batches
+        self.drop_last = drop_last
+    def __iter__(self):
+        order = np.random.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for i in range(0, len(order), self.bucket_size):
+            bucket = order[i:i + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            batches += [bucket[j:j + self.batch_size] for j in range(0, len(bucket), self.batch_size)]
+        if self.drop_last:
+            batches = [b for b in batches if len(b) == self.batch_size]
+        if self.shuffle:
+            random.shuffle(batches)
+        return iter([b.tolist() for b in batches])
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        full, rest = divmod(len(self.lengths), self.bucket_size)
+        return full * -(-self.bucket_size // self.batch_size) + -(-rest // self.batch_size)
+
+def pad_collate(batch):
+    """(x, y, {'mask': mask, ...}): curves right-padded with zeros to (B, 1, L_max).
+
+    mask is True on padding; any per-item extras (e.g. the fixed-length
+    global view) are stacked into the same dict.
+    """
+    xs, ys = [b[0] for b in batch], [b[1] for b in batch]
+    lengths = torch.tensor([x.shape[-1] for x in xs])
+    x = torch.zeros(len(xs), 1, int(lengths.max()))
+    for i, xi in enumerate(xs):
+        x[i, :, :xi.shape[-1]] = xi
+    extras = {'mask': torch.arange(x.shape[-1])[None, :] >= lengths[:, None]}
+    if len(batch[0]) > 2:
+        for name in batch[0][2]:
+            extras[name] = torch.stack([b[2][name] for b in batch])
+    return x, torch.stack(ys), extras
@@ -0,0 +1,70 @@
+# embed.py
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader
+from models import FullModel
+from features import catalog_feature_matrix
+from dataset import LC_Dataset, LengthBucketSampler, pad_collate
+
+def load_inputs(args):
+    """(X, ids) from a preprocessed .npz or a catalog CSV; X is an LC_Dataset for light curves"""
+    if args.npz:
+        data = np.load(args.npz, allow_pickle=True)
+        ids = np.array([m.get('id') for m in data['meta']], dtype=object) if 'meta' in data.files else None
+        X = data['X']
+        if 'lengths' in data.files or not (args.catalog_only or (X.ndim == 2 and X.shape[1] == args.n_features)):
+            X = LC_Dataset(args.npz)
+        return X, ids
+    df = pd.read_csv(args.csv, comment='#')
+    X = catalog_feature_matrix(df)
+    ids = df['kepoi_name'].to_numpy() if 'kepoi_name' in df.columns else df['kepid'].astype(str).to_numpy()
+    return X, ids
+
+def main(args):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    X, ids = load_inputs(args)
+    catalog_only = not isinstance(X, LC_Dataset)
+    seq_len = X.shape[-1] if catalog_only else int(X.lengths.max())
+    global_len = 0 if catalog_only else X.global_len  # X_global stored by preprocess
+    model = FullModel(seq_len=seq_len, n_tab_features=args.n_features if catalog_only else 0, catalog_only=catalog_only,
+                      global_len=global_len)
+    model.load_state_dict(torch.load(args.model, map_location=device))
+    model.to(device)
+    model.eval()
+
+    # written straight into a .npy memmap, so the full matrix never has to fit in RAM twice
+    out = np.lib.format.open_memmap(args.out, mode='w+', dtype=np.float32, shape=(len(X), model.embedding_dim))
+    with torch.no_grad():
+        if catalog_only:
+            for i in range(0, len(X), args.batch_size):
+                x = torch.from_numpy(np.ascontiguousarray(X[i:i+args.batch_size], dtype=np.float32)).to(device)
+                out[i:i+args.batch_size] = model.embed(x).cpu().numpy()
+        else:
+            # ragged curves are bucketed by length, padded per batch and masked in the model;
+            # the sampler doesn't shuffle, so its batches say which rows each result fills
+            batches = list(LengthBucketSampler(X.lengths, args.batch_size, shuffle=False))
+            loader = DataLoader(X, batch_sampler=batches, collate_fn=pad_collate if X.variable_length else None)
+            for rows, (x, _, *extra) in zip(batches, loader):  # extra: mask and x_global
+                kwargs = {k: v.to(device) for k, v in extra[0].items()} if extra else {}
+                out[rows] = model.embed(x.to(device), **kwargs).cpu().numpy()
+    out.flush()
+    if ids is not None:
+        ids_path = args.out[:-4] + '_ids.npy' if args.out.endswith('.npy') else args.out + '_ids.npy'
+        np.save(ids_path, ids.astype(str))
+        print("Saved ids:", ids_path)
+    print("Saved:", args.out, "shape:", out.shape)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write penultimate-layer embeddings to a memory-mappable .npy')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--npz', help='Preprocessed dataset (catalog features or folded light curves)')
+    src.add_argument('--csv', help='NASA cumulative-format catalog CSV')
+    parser.add_argument('--model', default='nasa_model.pth')
+    parser.add_argument('--out', default='embeddings.npy')
+    parser.add_argument('--batch-size', type=int, default=4096)
+    parser.add_argument('--n-features', type=int, default=13, help='Catalog feature count')
+    parser.add_argument('--catalog-only', action='store_true', help='Force the catalog MLP model')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,102 @@
+# eval_metrics.py
+import numpy as np
+
+def _trapezoid(x, y):
+    return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) * 0.5))
+
+class StreamingBinaryMetrics:
+    """Incremental PR-AUC / ROC-AUC / accuracy / F1 for binary classifiers.
+
+    Exact mode (n_bins=None) buffers scores and sorts them once in compute(),
+    matching sklearn's precision_recall_curve/auc and roc_auc_score. Binned
+    mode keeps two fixed-size histograms of positive/negative scores, so
+    update() is O(batch) and compute() is O(n_bins) regardless of how many
+    samples were seen; AUCs are then accurate to the bin resolution.
+    Accuracy and F1 at `threshold` are always exact.
+    """
+    def __init__(self, n_bins=None, threshold=0.5):
+        self.n_bins = n_bins
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.tp = self.fp = self.tn = self.fn = 0
+        if self.n_bins:
+            self.pos_hist = np.zeros(self.n_bins, dtype=np.int64)
+            self.neg_hist = np.zeros(self.n_bins, dtype=np.int64)
+        else:
+            self._ys = []
+            self._ps = []
+
+    @property
+    def count(self):
+        return self.tp + self.fp + self.tn + self.fn
+
+    def update(self, y_true, p):
+        y_true = np.asarray(y_true).astype(bool).ravel()
+        p = np.asarray(p, dtype=np.float64).ravel()
+        pred = p >= self.threshold
+        tp = int(np.count_nonzero(pred & y_true))
+        fp = int(np.count_nonzero(pred)) - tp
+        fn = int(np.count_nonzero(y_true)) - tp
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+        self.tn += len(p) - tp - fp - fn
+        if self.n_bins:
+            idx = np.clip((p * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+            self.pos_hist += np.bincount(idx[y_true], minlength=self.n_bins)
+            self.neg_hist += np.bincount(idx[~y_true], minlength=self.n_bins)
+        else:
+            self._ys.append(y_true)
+            self._ps.append(p)
+
+    def _cumulative_counts(self):
+        # true/false positive counts at each distinct threshold, highest first
+        if self.n_bins:
+            tps = np.cumsum(self.pos_hist[::-1])
+            fps = np.cumsum(self.neg_hist[::-1])
+            keep = (self.pos_hist[::-1] + self.neg_hist[::-1]) > 0
+            return tps[keep], fps[keep]
+        y_true = np.concatenate(self._ys) if self._ys else np.zeros(0, dtype=bool)
+        p = np.concatenate(self._ps) if self._ps else np.zeros(0)
+        order = np.argsort(p, kind='mergesort')[::-1]
+        p = p[order]
+        y_true = y_true[order]
+        last = np.r_[np.flatnonzero(np.diff(p)), len(p) - 1] if len(p) else np.zeros(0, dtype=np.int64)
+        tps = np.cumsum(y_true)[last]
+        fps = last + 1 - tps
+        return tps, fps
+
+    def compute(self):
+        tps, fps = self._cumulative_counts()
+        n_pos = tps[-1] if len(tps) else 0
+        n_neg = fps[-1] if len(fps) else 0
+
+        if n_pos > 0 and n_neg > 0:
+            tpr = np.r_[0.0, tps / n_pos]
+            fpr = np.r_[0.0, fps / n_neg]
+            roc = _trapezoid(fpr, tpr)
+        else:
+            roc = float('nan')  # undefined with a single class
+
+        if n_pos > 0:
+            precision = tps / (tps + fps)
+            recall = tps / n_pos
+            pr_auc = _trapezoid(np.r_[0.0, recall], np.r_[1.0, precision])
+        else:
+            pr_auc = float('nan')
+
+        n = self.count
+        acc = (self.tp + self.tn) / n if n else float('nan')
+        denom = 2 * self.tp + self.fp + self.fn
+        f1 = 2 * self.tp / denom if denom else 0.0
+        return {'pr_auc': pr_auc, 'roc_auc': roc, 'acc': acc, 'f1': f1, 'n': n}
+
+    def arrays(self):
+        """Buffered (y_true, p) in exact mode; (None, None) in binned mode"""
+        if self.n_bins:
+            return None, None
+        if not self._ys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._ys).astype(np.int64), np.concatenate(self._ps)
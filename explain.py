@@ -0,0 +1,115 @@
+# explain.py
+import copy
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import torch
+import torch.nn as nn
+
+from features import CATALOG_FEATURES
+
+class _LogitMargin(nn.Module):
+    """Planet-vs-not log-odds (logit1 - logit0) as a single output for the explainer"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        logits = self.model(x)
+        return (logits[:, 1] - logits[:, 0]).unsqueeze(1)
+
+def feature_key(features):
+    return hashlib.sha1(np.ascontiguousarray(features, dtype=np.float32).tobytes()).hexdigest()
+
+class AttributionService:
+    """Batched SHAP (DeepLIFT) attributions for the 13 catalog features, off the request path.
+
+    Requests are queued and picked up by background worker threads, which
+    drain up to `max_batch` pending rows and explain them in a single
+    explainer call. Results are cached by a hash of the float32 feature
+    vector (LRU, `cache_size` entries), and rows already being computed are
+    shared rather than explained twice. Each worker explains a private copy
+    of the model: DeepExplainer installs hooks on the modules it explains,
+    which must not leak into concurrent predictions or other workers.
+    """
+    def __init__(self, model, background, device, max_batch=64, workers=1, cache_size=10000):
+        self.device = device
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._model = model
+        self._background = torch.as_tensor(np.asarray(background, dtype=np.float32), device=device)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._workers = [threading.Thread(target=self._run, name=f'explain-{i}', daemon=True) for i in range(workers)]
+        for t in self._workers:
+            t.start()
+
+    def _make_explainer(self):
+        import shap  # heavy import, only paid once explanations are requested
+        margin = _LogitMargin(copy.deepcopy(self._model)).to(self.device).eval()
+        return shap.DeepExplainer(margin, self._background)
+
+    def submit(self, X):
+        """One Future per row of X resolving to {'base_value', 'attributions'}"""
+        futures = []
+        with self._lock:
+            for row in np.atleast_2d(np.asarray(X, dtype=np.float32)):
+                key = feature_key(row)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    f = Future()
+                    f.set_result(self._cache[key])
+                elif key in self._inflight:
+                    f = self._inflight[key]
+                else:
+                    f = Future()
+                    self._inflight[key] = f
+                    self._queue.put((key, row))
+                futures.append(f)
+        return futures
+
+    def cached(self, row):
+        with self._lock:
+            return self._cache.get(feature_key(row))
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        explainer = None
+        while True:
+            batch = self._next_batch()
+            keys = [k for k, _ in batch]
+            try:
+                if explainer is None:
+                    explainer = self._make_explainer()
+                x = torch.as_tensor(np.stack([r for _, r in batch]), device=self.device)
+                values = np.asarray(explainer.shap_values(x)).reshape(len(batch), len(CATALOG_FEATURES))
+                base = float(np.ravel(explainer.expected_value)[0])
+                results = [{'base_value': base,
+                            'attributions': dict(zip(CATALOG_FEATURES, map(float, v)))} for v in values]
+            except Exception as e:
+                with self._lock:
+                    futures = [self._inflight.pop(k) for k in keys]
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            with self._lock:
+                futures = [self._inflight.pop(k) for k in keys]
+                for k, r in zip(keys, results):
+                    self._cache[k] = r
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for f, r in zip(futures, results):
+                f.set_result(r)
@@ -0,0 +1,87 @@
+# features.py
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+# Kepler epochs are BKJD = BJD - 2454833; BJD values (~2.45e6) are shifted to BKJD
+BKJD_OFFSET = 2454833.0
+BJD_MIN = 2.4e6
+
+def bjd_to_bkjd(t):
+    return np.where(t > BJD_MIN, t - BKJD_OFFSET, t)
+
+class FeatureSpec(NamedTuple):
+    name: str
+    default: float        # used when the value is absent, None or NaN
+    valid: tuple          # inclusive (low, high); values outside are rejected
+    required: bool = False  # catalog / CSV inputs must carry the column
+    convert: object = None  # applied to the float64 column before the range check
+
+# The one declaration of the catalog model's inputs, shared by preprocessing,
+# /predict_csv, jobs, /similar, /explain, /embed_csv and the WebSocket endpoints.
+# Defaults are typical KOI values (catalog medians, rounded); koi_smass and
+# koi_sage are absent from the cumulative table, so the model has only ever
+# seen their defaults. Every feature is float32: the model takes one float32 matrix.
+FEATURE_SCHEMA = [
+    FeatureSpec('koi_period',   9.75,  (0.0, 1e6), required=True),  # days
+    FeatureSpec('koi_time0bk',  137.2, (0.0, 1e5), required=True, convert=bjd_to_bkjd),  # BKJD (BJD converted)
+    FeatureSpec('koi_impact',   0.54,  (0.0, 200.0)),
+    FeatureSpec('koi_duration', 3.8,   (0.0, 1e3)),   # hours
+    FeatureSpec('koi_depth',    420.0, (0.0, 1e7)),   # ppm
+    FeatureSpec('koi_prad',     2.4,   (0.0, 1e6)),   # Earth radii
+    FeatureSpec('koi_teq',      880.0, (0.0, 1e5)),   # K
+    FeatureSpec('koi_insol',    140.0, (0.0, 1e9)),   # Earth flux
+    FeatureSpec('koi_slogg',    4.44,  (0.0, 10.0)),  # log10(cm/s^2)
+    FeatureSpec('koi_srad',     1.0,   (0.0, 1e4)),   # Solar radii
+    FeatureSpec('koi_steff',    5770.0, (0.0, 1e5)),  # K
+    FeatureSpec('koi_smass',    1.0,   (0.0, 1e3)),   # Solar masses
+    FeatureSpec('koi_sage',     4.5,   (0.0, 20.0)),  # Gyr
+]
+# bumped whenever defaults, ranges or conversions change, so caches of scored features go stale
+FEATURE_SCHEMA_VERSION = 3
+
+# order of the 13 catalog features the catalog model consumes
+CATALOG_FEATURES = [f.name for f in FEATURE_SCHEMA]
+REQUIRED_FEATURES = [f.name for f in FEATURE_SCHEMA if f.required]
+FEATURE_DEFAULTS = {f.name: f.default for f in FEATURE_SCHEMA}
+
+def catalog_feature_matrix(data, return_invalid=False, require=True):
+    """Contiguous float32 (N, 13) feature matrix from a DataFrame or a list of dicts/Series.
+
+    Whole columns are converted at once: reindex to CATALOG_FEATURES, then
+    replace absent, None and NaN values with the schema default (zeros are
+    kept). With `require` set, a required column must be present (else
+    KeyError) and hold a value in every row. Rows holding a missing required,
+    non-numeric or out-of-range value raise ValueError, or with
+    return_invalid=True are set to the defaults and flagged in a boolean
+    mask so callers can report them per row.
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data))
+    if require:
+        for name in REQUIRED_FEATURES:
+            if name not in df.columns:
+                raise KeyError(name)
+    X = np.empty((len(df), len(FEATURE_SCHEMA)), dtype=np.float32)
+    invalid = np.zeros(len(df), dtype=bool)
+    for j, spec in enumerate(FEATURE_SCHEMA):
+        if spec.name not in df.columns:
+            X[:, j] = spec.default
+            continue
+        raw = df[spec.name]
+        col = raw if pd.api.types.is_numeric_dtype(raw) and not pd.api.types.is_bool_dtype(raw) \
+            else pd.to_numeric(raw, errors='coerce')
+        values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        if spec.convert is not None:
+            values = spec.convert(values)
+        missing = np.isnan(values)
+        lo, hi = spec.valid
+        with np.errstate(invalid='ignore'):
+            invalid |= (missing & raw.notna().to_numpy()) | (values < lo) | (values > hi)
+        if require and spec.required:
+            invalid |= missing
+        X[:, j] = np.where(missing, spec.default, values)
+    if invalid.any():
+        if not return_invalid:
+            raise ValueError(f"Missing, non-numeric or out-of-range catalog feature value in {int(invalid.sum())} row(s)")
+        X[invalid] = [f.default for f in FEATURE_SCHEMA]
+    return (X, invalid) if return_invalid else X
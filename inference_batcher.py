@@ -0,0 +1,66 @@
+# inference_batcher.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+class InferenceBatcher:
+    """Coalesces concurrent single-candidate predictions into batched forward passes.
+
+    `predict_fn(X)` maps a float32 (N, F) matrix to N probabilities and runs
+    on one worker thread, so the event loop keeps receiving while the model
+    works. Requests arriving during a forward pass are queued and answered
+    together by the next one: batch size grows with load, and an idle server
+    still answers a lone request immediately.
+    """
+    def __init__(self, predict_fn, max_batch=256):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self._pending = []
+        self._draining = False
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='infer')
+
+    async def predict(self, features):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((features, future))
+        if not self._draining:
+            self._draining = True
+            self._task = asyncio.create_task(self._drain())
+        return await future
+
+    async def close(self):
+        """Cancel the drain task and fail whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, fut in self._pending:
+            if not fut.done():
+                fut.cancel()
+        self._pending = []
+        self._executor.shutdown(wait=False)
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                batch = [(f, fut) for f, fut in batch if not fut.cancelled()]
+                if not batch:
+                    continue
+                try:
+                    X = np.stack([f for f, _ in batch]).astype(np.float32, copy=False)
+                    probs = await loop.run_in_executor(self._executor, self.predict_fn, X)
+                except Exception as e:
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                for (_, fut), p in zip(batch, probs):
+                    if not fut.done():
+                        fut.set_result(float(p))
+        finally:
+            self._draining = False
@@ -0,0 +1,92 @@
+# instrumentation.py
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import torch
+
+PHASES = ('data_wait', 'h2d', 'forward', 'backward', 'optimizer')
+
+class StepTimer:
+    """Per-step wall-clock breakdown of a training loop.
+
+    Phases are timed with perf_counter; on CUDA the device is synchronized at
+    the end of each phase so kernel time is attributed to the phase that
+    launched it (this costs some overlap, so only enable it when measuring).
+    When `label_ranges` is set each phase is also emitted as a
+    torch.profiler.record_function range, so it shows up in profiler traces.
+    A disabled timer is a no-op.
+    """
+    def __init__(self, device, enabled=True, label_ranges=False):
+        self.enabled = enabled
+        self.label_ranges = label_ranges
+        self._sync = enabled and device.type == 'cuda'
+        self.reset()
+
+    def reset(self):
+        self.totals = defaultdict(float)
+        self.steps = 0
+        self.samples = 0
+        self._start = time.perf_counter()
+
+    def _synchronize(self):
+        if self._sync:
+            torch.cuda.synchronize()
+
+    @contextmanager
+    def _timed(self, name):
+        label = torch.profiler.record_function(name) if self.label_ranges else nullcontext()
+        t0 = time.perf_counter()
+        with label:
+            yield
+            self._synchronize()
+        self.totals[name] += time.perf_counter() - t0
+
+    def phase(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    def iterate(self, loader):
+        """Yield batches from loader, timing how long each next() blocks"""
+        it = iter(loader)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                batch = next(it)
+            except StopIteration:
+                return
+            if self.enabled:
+                self.totals['data_wait'] += time.perf_counter() - t0
+            yield batch
+
+    def step(self, batch_size):
+        self.steps += 1
+        self.samples += batch_size
+
+    def summary(self):
+        """Mean ms per step for each phase, plus overall samples/sec"""
+        elapsed = time.perf_counter() - self._start
+        steps = max(self.steps, 1)
+        out = {f'{name}_ms': 1000.0 * self.totals[name] / steps for name in PHASES}
+        out['step_ms'] = 1000.0 * elapsed / steps
+        out['samples_per_sec'] = self.samples / elapsed if elapsed > 0 else 0.0
+        out['data_wait_frac'] = self.totals['data_wait'] / elapsed if elapsed > 0 else 0.0
+        return out
+
+    def format(self):
+        s = self.summary()
+        parts = ' '.join(f"{name} {s[name + '_ms']:.2f}ms" for name in PHASES)
+        return f"{parts} | {s['samples_per_sec']:.0f} samples/s, data wait {100 * s['data_wait_frac']:.0f}%"
+
+def make_profiler(log_dir, active_steps, wait_steps=1, warmup_steps=1):
+    """torch.profiler capture window writing traces for TensorBoard's profiler plugin"""
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait_steps, warmup=warmup_steps, active=active_steps, repeat=1),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(log_dir),
+        record_shapes=True,
+        profile_memory=True,
+    )
@@ -0,0 +1,221 @@
+# jobs.py
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from structured_logging import get_logger, request_id_var
+
+logger = get_logger('jobs')
+
+CHUNK_ROWS = 20000
+# a runner touches its running jobs this often; a running job untouched for
+# STALE_SECONDS belongs to a process that died and is re-queued
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,          -- queued | running | done | failed
+    filename TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    total_rows INTEGER,            -- estimated from line count before scoring
+    done_rows INTEGER NOT NULL DEFAULT 0,
+    error_rows INTEGER NOT NULL DEFAULT 0,
+    dropped_rows INTEGER NOT NULL DEFAULT 0,  -- removed by cleaning (empty, or no positive period / epoch), not in result.csv
+    error TEXT,
+    owner_pid INTEGER              -- informational; PIDs repeat across restarts (often 1 in a container)
+)
+"""
+# columns added after the first release; ALTER-ed into older jobs.db files
+_ADDED_COLUMNS = {'dropped_rows': 'INTEGER NOT NULL DEFAULT 0'}
+
+class JobStore:
+    """Job metadata in SQLite, inputs and results as files under root/<job_id>/"""
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, 'jobs.db')
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(_SCHEMA)
+            existing = {r['name'] for r in db.execute('PRAGMA table_info(jobs)')}
+            for name, decl in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {name} {decl}')
+
+    def _connect(self):
+        # short-lived connections: safe across threads and uvicorn worker processes
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def input_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'input.csv')
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'result.csv')
+
+    def create(self, filename):
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        now = time.time()
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, status, filename, created, updated) VALUES (?, ?, ?, ?, ?)',
+                       (job_id, 'queued', filename, now, now))
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id):
+        """Atomically move a queued job to running for this process"""
+        with self._connect() as db:
+            cur = db.execute("UPDATE jobs SET status = 'running', owner_pid = ?, updated = ? WHERE id = ? AND status = 'queued'",
+                             (os.getpid(), time.time(), job_id))
+        return cur.rowcount == 1
+
+    def update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        cols = ', '.join(f'{k} = ?' for k in fields)
+        with self._connect() as db:
+            db.execute(f'UPDATE jobs SET {cols} WHERE id = ?', (*fields.values(), job_id))
+
+    def heartbeat(self, job_ids):
+        """Mark running jobs as still owned by a live process"""
+        if not job_ids:
+            return
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET updated = ? WHERE status = 'running' AND id IN ({', '.join('?' * len(job_ids))})",
+                       (time.time(), *job_ids))
+
+    def recover(self, stale_after=STALE_SECONDS, startup=False):
+        """Re-queue running jobs whose owner stopped heartbeating; returns the ids to submit.
+
+        With startup=True, jobs left running under this process's own PID are
+        re-queued at once (nothing runs here yet, so their owner was an earlier
+        process that had the same PID), and every queued job is returned.
+        """
+        now = time.time()
+        cutoff = now - stale_after
+        own_pid = os.getpid() if startup else -1
+        stale = "status = 'running' AND (updated < ? OR owner_pid = ?)"
+        with self._connect() as db:
+            requeued = []
+            for r in db.execute(f'SELECT id FROM jobs WHERE {stale}', (cutoff, own_pid)).fetchall():
+                # conditional on still being stale, so only one process re-queues a job
+                cur = db.execute("UPDATE jobs SET status = 'queued', done_rows = 0, error_rows = 0, dropped_rows = 0, "
+                                 f"updated = ? WHERE id = ? AND {stale}", (now, r['id'], cutoff, own_pid))
+                if cur.rowcount:
+                    requeued.append(r['id'])
+            if startup:
+                return [r['id'] for r in db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created")]
+        return requeued
+
+    def delete(self, job_id):
+        with self._connect() as db:
+            db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+def count_data_lines(path):
+    """Non-empty, non-comment lines after the header; a cheap progress denominator"""
+    n = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip() and not line.startswith(b'#'):
+                n += 1
+    return max(n - 1, 0)
+
+class JobRunner:
+    """Scores queued CSV jobs on a local thread pool, chunk by chunk.
+
+    `make_cleaner(columns)` is called once per file with its header and
+    returns the function that maps each raw chunk onto the model's columns,
+    so every chunk of a file is mapped alike; `score_chunk(df)` returns a
+    DataFrame of per-row results. Both are supplied by the API so jobs and
+    /predict_csv share feature handling. Rows the cleaner removes are
+    counted in dropped_rows rather than written to the result.
+    Results are appended to result.csv as each chunk finishes, so memory
+    stays bounded by CHUNK_ROWS regardless of file size. A watcher thread
+    heartbeats this runner's jobs and re-queues jobs whose owner stopped.
+    """
+    def __init__(self, store, make_cleaner, score_chunk, workers=1, chunk_rows=CHUNK_ROWS,
+                 heartbeat_seconds=HEARTBEAT_SECONDS, stale_after=STALE_SECONDS):
+        self.store = store
+        self.make_cleaner = make_cleaner
+        self.score_chunk = score_chunk
+        self.chunk_rows = chunk_rows
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_after = stale_after
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._running = set()
+        self._lock = threading.Lock()
+        for job_id in store.recover(stale_after, startup=True):
+            self.submit(job_id)
+        threading.Thread(target=self._watch, name='job-heartbeat', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                with self._lock:
+                    running = list(self._running)
+                self.store.heartbeat(running)
+                for job_id in self.store.recover(self.stale_after):
+                    logger.warning("Re-queued job abandoned by a stopped process", extra={'fields': {'job_id': job_id}})
+                    self.submit(job_id)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+    def submit(self, job_id):
+        self.pool.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        if not self.store.claim(job_id):
+            return  # taken by another worker process
+        with self._lock:
+            self._running.add(job_id)
+        request_id_var.set(job_id[:16])
+        t0 = time.perf_counter()
+        src = self.store.input_path(job_id)
+        dst = self.store.result_path(job_id)
+        try:
+            self.store.update(job_id, total_rows=count_data_lines(src))
+            done = errors = dropped = 0
+            tmp = dst + '.tmp'
+            header = True
+            clean = None
+            for chunk in pd.read_csv(src, chunksize=self.chunk_rows, comment='#', on_bad_lines='skip', low_memory=False):
+                if clean is None:
+                    clean = self.make_cleaner(list(chunk.columns))
+                cleaned = clean(chunk)
+                scored = self.score_chunk(cleaned)
+                scored.to_csv(tmp, mode='w' if header else 'a', header=header, index=False)
+                header = False
+                done += len(chunk)
+                dropped += len(chunk) - len(cleaned)
+                errors += int(scored['error'].notna().sum()) if 'error' in scored else 0
+                self.store.update(job_id, done_rows=done, error_rows=errors, dropped_rows=dropped)
+            if header:
+                raise ValueError("No rows found in file")
+            os.replace(tmp, dst)
+            self.store.update(job_id, status='done', done_rows=done)
+            logger.info("Job finished", extra={'fields': {'job_id': job_id, 'rows': done, 'errors': errors,
+                                                          'dropped': dropped, 'seconds': round(time.perf_counter() - t0, 3)}})
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e))
+            logger.warning("Job failed", extra={'fields': {'job_id': job_id, 'error': str(e)}})
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
@@ -1,49 +1,180 @@
 # models.py
+import math
+from typing import Optional
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+# Variable-length batches are right-padded; masks are (B, L) and True on padding,
+# the nn.Transformer src_key_padding_mask convention.
+
+def padding_mask(lengths, max_len: int):
+    return torch.arange(max_len, device=lengths.device)[None, :] >= lengths[:, None]
+
+def zero_padding(x, lengths):
+    return x.masked_fill(padding_mask(lengths, x.size(-1)).unsqueeze(1), 0.0)
+
+def masked_mean(x, mask):
+    """Mean of (B, C, L) over positions where the (B, L) padding mask is False"""
+    keep = (~mask).unsqueeze(1).to(x.dtype)
+    return (x * keep).sum(-1) / keep.sum(-1).clamp(min=1.0)
+
+class MaskedBatchNorm1d(nn.BatchNorm1d):
+    """BatchNorm1d whose training-mode batch statistics skip padded positions.
+
+    Without a mask, or in eval mode, it is plain BatchNorm1d. With a (B, L)
+    padding mask in training, mean and variance (and the running estimates)
+    come from real positions only, so a padded batch is normalized exactly
+    as the same curves would be without padding.
+    """
+    def forward(self, x, mask: Optional[torch.Tensor] = None):
+        if mask is None or (not self.training and self.track_running_stats):
+            return super().forward(x)
+        xf = x.float()
+        keep = (~mask).unsqueeze(1).to(xf.dtype)  # (B, 1, L)
+        n = keep.sum()
+        mean = (xf * keep).sum((0, 2)) / n
+        var = ((xf - mean[None, :, None]) ** 2 * keep).sum((0, 2)) / n
+        if self.training and self.track_running_stats:
+            with torch.no_grad():
+                self.num_batches_tracked += 1
+                momentum = self.momentum if self.momentum is not None else 1.0 / float(self.num_batches_tracked)
+                self.running_mean.lerp_(mean.to(self.running_mean.dtype), momentum)
+                unbiased = var * n / (n - 1).clamp(min=1.0)
+                self.running_var.lerp_(unbiased.to(self.running_var.dtype), momentum)
+        out = (xf - mean[None, :, None]) * torch.rsqrt(var[None, :, None] + self.eps)
+        if self.affine:
+            out = out * self.weight[None, :, None] + self.bias[None, :, None]
+        return out.to(x.dtype)
+
 class ConvBlock(nn.Module):
     def __init__(self, in_ch, out_ch, k, p):
         super().__init__()
         self.conv = nn.Conv1d(in_ch, out_ch, kernel_size=k, padding=p)
-        self.bn = nn.BatchNorm1d(out_ch)
+        self.bn = MaskedBatchNorm1d(out_ch)
         self.act = nn.ReLU()
-    def forward(self,x):
-        return self.act(self.bn(self.conv(x)))
+    def forward(self, x, mask: Optional[torch.Tensor] = None):
+        return self.act(self.bn(self.conv(x), mask))
 
 class TimeCNN(nn.Module):
+    # checkpoints saved before the layers were named kept them in an nn.Sequential
+    _LEGACY_KEYS = {'net.0.': 'block1.', 'net.2.': 'block2.', 'net.4.': 'block3.', 'net.7.': 'fc.'}
+
     def __init__(self, in_len):
         super().__init__()
-        self.net = nn.Sequential(
-            ConvBlock(1, 32, 7, 3),
-            nn.MaxPool1d(2),
-            ConvBlock(32, 64, 5, 2),
-            nn.MaxPool1d(2),
-            ConvBlock(64, 128, 3, 1),
-            nn.AdaptiveAvgPool1d(1),
-            nn.Flatten(),
-            nn.Linear(128, 128),
-            nn.ReLU()
-        )
-    def forward(self, x):
-        return self.net(x)  # (B, 128)
+        self.block1 = ConvBlock(1, 32, 7, 3)
+        self.pool1 = nn.MaxPool1d(2)
+        self.block2 = ConvBlock(32, 64, 5, 2)
+        self.pool2 = nn.MaxPool1d(2)
+        self.block3 = ConvBlock(64, 128, 3, 1)
+        self.pool = nn.AdaptiveAvgPool1d(1)
+        self.fc = nn.Linear(128, 128)
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        for old, new in self._LEGACY_KEYS.items():
+            for key in [k for k in state_dict if k.startswith(prefix + old)]:
+                state_dict[prefix + new + key[len(prefix + old):]] = state_dict.pop(key)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+    def forward(self, x, mask: Optional[torch.Tensor] = None):
+        if mask is None:
+            x = self.pool2(self.block2(self.pool1(self.block1(x))))
+            x = self.pool(self.block3(x)).flatten(1)
+        else:
+            # zero the padding ahead of every conv so it never leaks into real bins,
+            # keep it out of the batch-norm statistics, and average only over real positions
+            lengths = (~mask).sum(1)
+            half = torch.div(lengths, 2, rounding_mode='floor')  # after each MaxPool1d(2)
+            quarter = torch.div(half, 2, rounding_mode='floor')
+            x = zero_padding(x, lengths)
+            x = zero_padding(self.pool1(self.block1(x, mask)), half)
+            mask = padding_mask(half, x.size(-1))
+            x = zero_padding(self.pool2(self.block2(x, mask)), quarter)
+            mask = padding_mask(quarter, x.size(-1))
+            x = masked_mean(self.block3(x, mask), mask)
+        return F.relu(self.fc(x))  # (B, 128)
+
+class SelfAttention(nn.Module):
+    """Multi-head self-attention on F.scaled_dot_product_attention.
+
+    Parameter names match nn.MultiheadAttention so existing checkpoints load.
+    There is no dropout on the attention weights: it would force the unfused
+    kernel that materializes the (L, L) score matrix, while without it CPU
+    and CUDA use flash attention in training as well as inference.
+    """
+    def __init__(self, d_model, nhead):
+        super().__init__()
+        self.nhead = nhead
+        self.in_proj_weight = nn.Parameter(torch.empty(3 * d_model, d_model))
+        self.in_proj_bias = nn.Parameter(torch.zeros(3 * d_model))
+        self.out_proj = nn.Linear(d_model, d_model)
+        nn.init.xavier_uniform_(self.in_proj_weight)
+        nn.init.zeros_(self.out_proj.bias)
+    def forward(self, x, key_padding_mask: Optional[torch.Tensor] = None):
+        B, L, D = x.shape
+        qkv = F.linear(x, self.in_proj_weight, self.in_proj_bias)
+        q, k, v = qkv.view(B, L, 3, self.nhead, D // self.nhead).permute(2, 0, 3, 1, 4).unbind(0)  # (B, h, L, D/h)
+        attn_mask = None if key_padding_mask is None else ~key_padding_mask[:, None, None, :]  # True = attend
+        out = F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask)
+        return self.out_proj(out.transpose(1, 2).reshape(B, L, D))
+
+class EncoderLayer(nn.Module):
+    """Post-norm encoder layer equivalent to nn.TransformerEncoderLayer(batch_first=True)"""
+    def __init__(self, d_model, nhead, dim_feedforward=128, dropout=0.1):
+        super().__init__()
+        self.self_attn = SelfAttention(d_model, nhead)
+        self.linear1 = nn.Linear(d_model, dim_feedforward)
+        self.linear2 = nn.Linear(dim_feedforward, d_model)
+        self.norm1 = nn.LayerNorm(d_model)
+        self.norm2 = nn.LayerNorm(d_model)
+        self.dropout = nn.Dropout(dropout)
+    def forward(self, x, src_key_padding_mask: Optional[torch.Tensor] = None):
+        x = self.norm1(x + self.dropout(self.self_attn(x, src_key_padding_mask)))
+        return self.norm2(x + self.dropout(self.linear2(self.dropout(F.relu(self.linear1(x))))))
+
+class Encoder(nn.Module):
+    def __init__(self, d_model, nhead, num_layers):
+        super().__init__()
+        self.layers = nn.ModuleList([EncoderLayer(d_model, nhead) for _ in range(num_layers)])
+    def forward(self, x, src_key_padding_mask: Optional[torch.Tensor] = None):
+        for layer in self.layers:
+            x = layer(x, src_key_padding_mask)
+        return x
 
 class SimpleTransformer(nn.Module):
-    def __init__(self, seq_len, d_model=64, nhead=4, num_layers=2):
+    """Light-curve encoder: conv tokenizer + self-attention, mean-pooled to (B, 64).
+
+    Curves longer than `max_tokens` bins are cut into non-overlapping patches
+    by a strided convolution (patch_size bins per token), so attention sees at
+    most `max_tokens` tokens and cost grows linearly with seq_len. Pass
+    patch_size explicitly to override; patch_size=1 is the original per-bin
+    tokenizer, which the default keeps for the 201-bin folds. With a padding
+    mask, padded tokens are excluded from attention and from the mean.
+    """
+    def __init__(self, seq_len, d_model=64, nhead=4, num_layers=2, patch_size=None, max_tokens=256):
         super().__init__()
-        self.proj = nn.Conv1d(1, d_model, kernel_size=3, padding=1)
-        encoder_layer = nn.TransformerEncoderLayer(d_model=d_model, nhead=nhead, dim_feedforward=128, dropout=0.1, batch_first=True)
-        self.encoder = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
+        self.patch_size = patch_size or max(1, math.ceil(seq_len / max_tokens))
+        if self.patch_size == 1:
+            self.proj = nn.Conv1d(1, d_model, kernel_size=3, padding=1)
+        else:
+            self.proj = nn.Conv1d(1, d_model, kernel_size=self.patch_size, stride=self.patch_size)
+        self.encoder = Encoder(d_model, nhead, num_layers)
         self.pool = nn.AdaptiveAvgPool1d(1)
         self.fc = nn.Linear(d_model, 64)
-    def forward(self, x):
+    def forward(self, x, mask: Optional[torch.Tensor] = None):
         # x: (B,1,L)
-        x = self.proj(x)           # (B, d_model, L)
-        x = x.permute(0,2,1)       # (B, L, d_model)
-        x = self.encoder(x)        # (B, L, d_model)
-        x = x.permute(0,2,1)       # (B, d_model, L)
-        x = self.pool(x).squeeze(-1)  # (B, d_model)
+        if self.patch_size > 1:
+            x = F.pad(x, (0, -x.size(-1) % self.patch_size))  # last partial patch
+        x = self.proj(x)           # (B, d_model, T), T = ceil(L / patch_size)
+        if mask is not None:
+            # a token is real if its patch holds at least one real bin
+            lengths = torch.div((~mask).sum(1) + self.patch_size - 1, self.patch_size, rounding_mode='floor')
+            mask = padding_mask(lengths, x.size(-1))
+        x = x.permute(0,2,1)       # (B, T, d_model)
+        x = self.encoder(x, mask)  # (B, T, d_model)
+        x = x.permute(0,2,1)       # (B, d_model, T)
+        if mask is None:
+            x = self.pool(x).squeeze(-1)  # (B, d_model)
+        else:
+            x = masked_mean(x, mask)
         return F.relu(self.fc(x))  # (B,64)
 
 class TabularMLP(nn.Module):
@@ -60,7 +191,7 @@ class TabularMLP(nn.Module):
         return self.net(x)
 
 class FullModel(nn.Module):
-    def __init__(self, seq_len, n_tab_features=0, catalog_only=False):
+    def __init__(self, seq_len, n_tab_features=0, catalog_only=False, global_len=0):
         super().__init__()
         self.catalog_only = catalog_only
 
@@ -81,13 +212,18 @@ class FullModel(nn.Module):
             # Original CNN + Transformer model
             self.cnn = TimeCNN(seq_len)
             self.trans = SimpleTransformer(seq_len)
+            final_in = 128+64
+            # optional second CNN column over the full-orbit global view
+            self.use_global = global_len>0
+            if self.use_global:
+                self.global_cnn = TimeCNN(global_len)
+                final_in += 128
             self.use_tab = n_tab_features>0
             if self.use_tab:
                 self.tab = TabularMLP(n_tab_features)
-                final_in = 128+64+32
-            else:
-                final_in = 128+64
+                final_in += 32
 
+        self.embedding_dim = final_in
         self.classifier = nn.Sequential(
             nn.Linear(final_in, 128),
             nn.ReLU(),
@@ -95,20 +231,30 @@ class FullModel(nn.Module):
             nn.Linear(128, 2)  # binary
         )
 
-    def forward(self, x, tab=None):
+    def embed(self, x, tab=None, mask=None, x_global=None):
+        """Penultimate features fed to the classifier head.
+
+        (B, 32) catalog_net output for catalog-only models, otherwise the
+        concatenated CNN (128) + Transformer (64) [+ global-view CNN (128)]
+        [+ tabular (32)] features. `mask` is the (B, L) padding mask of a
+        padded local-view batch; `x_global` is the (B, 1, G) global view,
+        required when the model was built with global_len > 0.
+        """
         if self.catalog_only:
             # Catalog features only
-            features = self.catalog_net(x)  # x is catalog features here
-            logits = self.classifier(features)
-        else:
-            # Original CNN + Transformer
-            # x: (B,1,L)
-            v1 = self.cnn(x)     # (B,128)
-            v2 = self.trans(x)   # (B,64)
-            if self.use_tab and tab is not None:
-                vt = self.tab(tab)
-                cat = torch.cat([v1,v2,vt], dim=1)
-            else:
-                cat = torch.cat([v1,v2], dim=1)
-            logits = self.classifier(cat)
-        return logits
\ No newline at end of file
+            return self.catalog_net(x)  # x is catalog features here
+        # Original CNN + Transformer
+        # x: (B,1,L)
+        v = [self.cnn(x, mask),     # (B,128)
+             self.trans(x, mask)]   # (B,64)
+        if self.use_global:
+            if x_global is None:
+                raise ValueError("Model was built with a global view (global_len > 0) but x_global was not given")
+            v.append(self.global_cnn(x_global))  # (B,128)
+        if self.use_tab and tab is not None:
+            v.append(self.tab(tab))
+        return torch.cat(v, dim=1)
+
+    def forward(self, x, tab=None, mask=None, x_global=None):
+        return self.classifier(self.embed(x, tab, mask, x_global))
+
@@ -0,0 +1,48 @@
+# normalization.py
+import copy
+import numpy as np
+import torch
+
+NORM_METHODS = ('none', 'standard', 'robust')
+
+def fit_input_norm(X, method='robust'):
+    """Per-feature (center, scale) fitted on training rows: mean/std or median/IQR"""
+    X = np.asarray(X, dtype=np.float64)
+    if method == 'standard':
+        center, scale = X.mean(axis=0), X.std(axis=0)
+    elif method == 'robust':
+        q25, center, q75 = np.percentile(X, [25, 50, 75], axis=0)
+        scale = q75 - q25
+    else:
+        raise ValueError(f"Unknown normalization '{method}', choose from {NORM_METHODS}")
+    # constant columns (e.g. koi_smass, koi_sage in the cumulative table) pass through centered
+    scale = np.where(scale > 1e-12, scale, 1.0)
+    return {'method': method, 'center': center.astype(np.float32), 'scale': scale.astype(np.float32)}
+
+def apply_input_norm(X, norm):
+    return ((np.asarray(X, dtype=np.float32) - norm['center']) / norm['scale']).astype(np.float32)
+
+def input_linear(model):
+    """The nn.Linear that reads raw tabular features, or None for light-curve-only models"""
+    if getattr(model, 'catalog_only', False):
+        return model.catalog_net[0]
+    if getattr(model, 'use_tab', False):
+        return model.tab.net[0]
+    return None
+
+def fold_input_norm(model, norm):
+    """Copy of `model` whose first Linear takes raw features: W' = W / s, b' = b - W' m.
+
+    The folded model computes exactly what `model` computes on normalized
+    inputs, so serving needs no preprocessing step and no extra op.
+    """
+    folded = copy.deepcopy(model)
+    linear = input_linear(folded)
+    if linear is None:
+        raise ValueError("Model has no tabular input layer to fold normalization into")
+    with torch.no_grad():
+        center = torch.as_tensor(norm['center'], dtype=linear.weight.dtype, device=linear.weight.device)
+        scale = torch.as_tensor(norm['scale'], dtype=linear.weight.dtype, device=linear.weight.device)
+        linear.weight.div_(scale)
+        linear.bias.sub_(linear.weight @ center)
+    return folded
@@ -0,0 +1,36 @@
+# precision.py
+import contextlib
+import os
+import torch
+
+PRECISIONS = ('fp32', 'bf16')
+
+def resolve_precision(value=None):
+    """CLI value if given, else TORCH_PRECISION from the environment (default fp32)"""
+    value = (value or os.getenv('TORCH_PRECISION') or 'fp32').lower()
+    if value not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{value}', choose from {PRECISIONS}")
+    return value
+
+def bf16_supported(device):
+    """bfloat16 matmul/conv kernels exist; on CPU this needs AVX512-BF16 or AMX for a speedup"""
+    if device.type == 'cuda':
+        return torch.cuda.is_bf16_supported()
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def autocast(device, precision, cuda_fp16=False):
+    """Mixed-precision context for forward passes.
+
+    bf16 autocasts matmuls and convolutions to bfloat16 on CPU or CUDA while
+    reductions, softmax and losses stay fp32; it has fp32's exponent range, so
+    training needs no loss scaling. cuda_fp16 keeps the GradScaler-based fp16
+    path used when training on a GPU.
+    """
+    if precision == 'bf16':
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    if cuda_fp16 and device.type == 'cuda':
+        return torch.autocast(device_type='cuda', dtype=torch.float16)
+    return contextlib.nullcontext()
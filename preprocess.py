@@ -2,15 +2,18 @@
 import numpy as np
 import pandas as pd
 from scipy.signal import savgol_filter
-from scipy import interpolate
 import os
 from tqdm import tqdm
+from features import catalog_feature_matrix
 
 # ---------------- parameters ----------------
 OUT_LEN = 201               # length of phase-folded vector (odd center point)
 WINDOW = 101                # smoothing window for detrend (must be odd)
 POLYORDER = 3
 PHASE_PAD = 0.1             # fraction of period to include on each side of transit center
+GLOBAL_LEN = 2001           # length of the full-orbit global view
+MIN_FOLD_LEN = 51           # bounds for variable-length (native cadence) folds
+MAX_FOLD_LEN = 2001
 BIN_METHOD = 'median'       # or 'mean'
 # --------------------------------------------
 
@@ -24,33 +27,73 @@ def detrend(time, flux, window=WINDOW, polyorder=POLYORDER):
         trend = savgol_filter(flux, window_length=window if window%2 else window+1, polyorder=polyorder)
     return flux / trend - 1.0  # normalized residual (approx relative flux)
 
-def phase_fold(time, flux, period, t0, width_frac=PHASE_PAD, out_len=OUT_LEN):
-    # compute phase around transit center (phase in [-width_frac, +width_frac])
-    phase = ((time - t0 + 0.5*period) % period) / period - 0.5
-    mask = np.abs(phase) <= width_frac
-    if mask.sum() < 10:
-        # fallback to use all data
-        mask = np.ones_like(phase, dtype=bool)
-    ptime = phase[mask]  # in units of period
-    pflux = flux[mask]
-    # rescale phase to [-1,1]
-    xp = np.linspace(-width_frac, width_frac, out_len)
-    try:
-        f = interpolate.interp1d(ptime, pflux, kind='linear', bounds_error=False, fill_value=np.nan)
-        y = f(xp)
-    except Exception:
-        # fallback: uniform binning
-        y = np.interp(xp, np.linspace(ptime.min(), ptime.max(), len(ptime)), pflux)
+def native_fold_len(time, period, width_frac=PHASE_PAD):
+    """Odd fold length with about one bin per cadence across the window.
+
+    Kepler long cadence (29.4 min) on a 10-day period gives ~99 bins, short
+    cadence or TESS 2-min data many more (capped at MAX_FOLD_LEN), so
+    sparse curves are not interpolated up and dense ones not averaged away.
+    """
+    cadence = np.median(np.diff(np.sort(time))) if len(time) > 1 else 0.0
+    if not cadence > 0:
+        return OUT_LEN
+    n = int(np.ceil(2 * width_frac * period / cadence))
+    return int(np.clip(n | 1, MIN_FOLD_LEN, MAX_FOLD_LEN))
+
+def fold_phase(time, period, t0):
+    """Orbital phase in [-0.5, 0.5) with the transit center at 0"""
+    return ((time - t0 + 0.5*period) % period) / period - 0.5
+
+def _standardize(y):
     # if NaNs, fill with local median
     if np.any(np.isnan(y)):
         med = np.nanmedian(y)
         y = np.nan_to_num(y, nan=med)
     # normalize by std
     std = y.std() if y.std() > 0 else 1.0
-    y = (y - y.mean()) / std
-    return y
+    return (y - y.mean()) / std
+
+def local_view(phase, flux, width_frac=PHASE_PAD, out_len=OUT_LEN):
+    """Transit window [-width_frac, +width_frac] interpolated to out_len points"""
+    keep = np.abs(phase) <= width_frac
+    if keep.sum() < 10:
+        # fallback to use all data
+        keep = np.ones_like(phase, dtype=bool)
+    ptime, pflux = phase[keep], flux[keep]
+    # only the window is sorted; folded orbits arrive as sorted runs, which a stable sort merges cheaply
+    order = np.argsort(ptime, kind='stable')
+    xp = np.linspace(-width_frac, width_frac, out_len)
+    y = np.interp(xp, ptime[order], pflux[order], left=np.nan, right=np.nan)
+    return _standardize(y)
+
+def global_view(phase, flux, out_len=GLOBAL_LEN):
+    """Whole orbit averaged into out_len equal phase bins; empty bins interpolated from neighbours"""
+    bins = np.minimum(((phase + 0.5) * out_len).astype(np.int64), out_len - 1)
+    counts = np.bincount(bins, minlength=out_len)
+    sums = np.bincount(bins, weights=flux, minlength=out_len)
+    filled = counts > 0
+    y = np.full(out_len, np.nan)
+    y[filled] = sums[filled] / counts[filled]
+    if filled.any() and not filled.all():
+        centers = np.arange(out_len)
+        y[~filled] = np.interp(centers[~filled], centers[filled], y[filled])
+    return _standardize(y)
+
+def phase_fold(time, flux, period, t0, width_frac=PHASE_PAD, out_len=OUT_LEN):
+    """Local transit view, the model's main light-curve input"""
+    return local_view(fold_phase(time, period, t0), flux, width_frac, out_len)
 
-def process_row(row, lc_folder=None):
+def phase_fold_views(time, flux, period, t0, width_frac=PHASE_PAD, out_len=OUT_LEN, global_len=GLOBAL_LEN):
+    """(global, local) views from one phase computation, as in the Kepler CNN setup.
+
+    The global view needs no sort (bins are counted), and the local view
+    sorts only the points inside its window, so both together cost little
+    more than phase_fold alone.
+    """
+    phase = fold_phase(time, period, t0)
+    return global_view(phase, flux, global_len), local_view(phase, flux, width_frac, out_len)
+
+def process_row(row, lc_folder=None, out_len=OUT_LEN, global_len=None):
     # row must have keys: 'time', 'flux' arrays OR path to file plus period,t0,label
     # here we assume per-row arrays are loaded already or separate file path columns
     # adapt based on your dataset storage.
@@ -59,10 +102,15 @@ def process_row(row, lc_folder=None):
     period = float(row['period'])
     t0 = float(row['t0'])
     flux = detrend(time, flux)
-    pf = phase_fold(time, flux, period, t0)
+    if out_len is None:
+        out_len = native_fold_len(time, period)
+    if global_len:
+        return phase_fold_views(time, flux, period, t0, out_len=out_len, global_len=global_len)  # (global, local)
+    pf = phase_fold(time, flux, period, t0, out_len=out_len)
     return pf
 
-def main(master_table_csv, out_npz='dataset.npz', lc_folder=None, use_catalog_features=False):
+def main(master_table_csv, out_npz='dataset.npz', lc_folder=None, use_catalog_features=False, variable_length=False,
+         global_len=GLOBAL_LEN):
     df = pd.read_csv(master_table_csv, comment='#')  # Skip comment lines for NASA files
 
     # Handle NASA Exoplanet Archive format
@@ -76,65 +124,66 @@ def main(master_table_csv, out_npz='dataset.npz', lc_folder=None, use_catalog_fe
         df['label'] = df['koi_disposition'].map({'CONFIRMED': 1, 'FALSE POSITIVE': 0, 'CANDIDATE': 1})
         use_catalog_features = True
 
+    if use_catalog_features:
+        # Use catalog features instead of light curves, converted column-wise in one pass
+        X = catalog_feature_matrix(df)
+        y = df['label'].astype(np.int64).to_numpy()
+        ids = df['id'] if 'id' in df.columns else pd.Series([None] * len(df))
+        meta = [{'id': i, 'period': p} for i, p in zip(ids, df['period'])]
+        np.savez_compressed(out_npz, X=X, y=y, meta=meta)
+        print("Saved:", out_npz, "X shape:", X.shape, "y shape:", y.shape)
+        return
+
     X = []
+    X_global = []
     y = []
     meta = []
+    out_len = None if variable_length else OUT_LEN
 
     for _, row in tqdm(df.iterrows(), total=len(df)):
-        if use_catalog_features:
-            # Use catalog features instead of light curves
-            features = extract_catalog_features(row)
-            X.append(features.astype(np.float32))
+        # Original light curve processing
+        # user must adapt to their dataset columns:
+        # If per-row light-curve is saved as file path in column 'lc_path', load it:
+        if lc_folder and 'lc_path' in row and not pd.isna(row['lc_path']):
+            lc = pd.read_csv(os.path.join(lc_folder, row['lc_path']))  # expects time,flux columns
+            row_time = lc['time'].values
+            row_flux = lc['flux'].values
+            r = {'time':row_time, 'flux':row_flux, 'period':row['period'], 't0':row['t0']}
+            views = process_row(r, out_len=out_len, global_len=global_len)
+        else:
+            # if arrays stored as strings (like "[1.0,2.0,...]"), eval or np.fromstring
+            # example expects 'time' and 'flux' columns with comma-separated floats
+            time = np.fromstring(row['time'].strip("[]"), sep=',')
+            flux = np.fromstring(row['flux'].strip("[]"), sep=',')
+            r = {'time':time, 'flux':flux, 'period':row['period'], 't0':row['t0']}
+            views = process_row(r, out_len=out_len, global_len=global_len)
+        if global_len:
+            gv, pf = views
+            X_global.append(gv.astype(np.float32))
         else:
-            # Original light curve processing
-            # user must adapt to their dataset columns:
-            # If per-row light-curve is saved as file path in column 'lc_path', load it:
-            if lc_folder and 'lc_path' in row and not pd.isna(row['lc_path']):
-                lc = pd.read_csv(os.path.join(lc_folder, row['lc_path']))  # expects time,flux columns
-                row_time = lc['time'].values
-                row_flux = lc['flux'].values
-                r = {'time':row_time, 'flux':row_flux, 'period':row['period'], 't0':row['t0']}
-                pf = process_row(r)
-            else:
-                # if arrays stored as strings (like "[1.0,2.0,...]"), eval or np.fromstring
-                # example expects 'time' and 'flux' columns with comma-separated floats
-                time = np.fromstring(row['time'].strip("[]"), sep=',')
-                flux = np.fromstring(row['flux'].strip("[]"), sep=',')
-                r = {'time':time, 'flux':flux, 'period':row['period'], 't0':row['t0']}
-                pf = process_row(r)
-            X.append(pf.astype(np.float32))
+            pf = views
+        X.append(pf.astype(np.float32))
 
         y.append(int(row['label']))
         meta.append({'id': row.get('id', None), 'period': row['period']})
 
-    X = np.stack(X)  # (N, feature_dim) or (N, OUT_LEN)
     y = np.array(y, dtype=np.int64)
-    np.savez_compressed(out_npz, X=X, y=y, meta=meta)
+    # full-orbit global views, (N, global_len), stored next to the local views in X
+    extra = {'X_global': np.stack(X_global)} if global_len else {}
+    if variable_length:
+        # ragged: curves concatenated end to end, split by lengths (see dataset.LC_Dataset)
+        lengths = np.array([len(x) for x in X], dtype=np.int64)
+        X = np.concatenate(X)
+        np.savez_compressed(out_npz, X=X, lengths=lengths, y=y, meta=meta, **extra)
+        print("Saved:", out_npz, "curves:", len(lengths), "lengths:", lengths.min(), "-", lengths.max())
+        return
+    X = np.stack(X)  # (N, OUT_LEN)
+    np.savez_compressed(out_npz, X=X, y=y, meta=meta, **extra)
     print("Saved:", out_npz, "X shape:", X.shape, "y shape:", y.shape)
 
 def extract_catalog_features(row):
-    """Extract relevant features from NASA catalog for ML model"""
-    features = []
-
-    # Basic orbital parameters
-    features.append(row['koi_period'])  # Period
-    features.append(row['koi_time0bk'])  # Transit time
-    features.append(row.get('koi_impact', 0))  # Impact parameter
-    features.append(row.get('koi_duration', 0))  # Transit duration
-    features.append(row.get('koi_depth', 0))  # Transit depth
-    features.append(row.get('koi_prad', 1))  # Planet radius (Earth radii)
-    features.append(row.get('koi_teq', 300))  # Equilibrium temperature
-    features.append(row.get('koi_insol', 1))  # Insolation flux
-    features.append(row.get('koi_slogg', 4.5))  # Stellar surface gravity
-    features.append(row.get('koi_srad', 1))  # Stellar radius
-    features.append(row.get('koi_steff', 5500))  # Stellar effective temperature
-    features.append(row.get('koi_smass', 1))  # Stellar mass
-    features.append(row.get('koi_sage', 4.5))  # Stellar age
-
-    # Fill NaN values with defaults
-    features = [f if not pd.isna(f) else 0 for f in features]
-
-    return np.array(features, dtype=np.float32)
+    """Extract relevant features from NASA catalog for ML model (one row; see features.catalog_feature_matrix)"""
+    return catalog_feature_matrix([row])[0]
 
 if __name__ == '__main__':
     import argparse
@@ -143,5 +192,9 @@ if __name__ == '__main__':
     parser.add_argument('--out', type=str, default='dataset.npz')
     parser.add_argument('--lc_folder', type=str, default=None)
     parser.add_argument('--catalog-only', action='store_true', help='Use catalog features only (NASA format)')
+    parser.add_argument('--variable-length', action='store_true',
+                        help='Fold each light curve at its native cadence resolution instead of OUT_LEN bins')
+    parser.add_argument('--global-len', type=int, default=GLOBAL_LEN,
+                        help='Bins in the full-orbit global view stored next to the local view (0 = local only)')
     args = parser.parse_args()
-    main(args.master, args.out, args.lc_folder, args.catalog_only)
\ No newline at end of file
+    main(args.master, args.out, args.lc_folder, args.catalog_only, args.variable_length, args.global_len)
\ No newline at end of file
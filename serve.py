@@ -0,0 +1,29 @@
+# serve.py
+"""Start the API server: `python serve.py` (or `python api_predict.py`, which hands over here).
+
+With WEB_CONCURRENCY > 1 this process is only the uvicorn supervisor. It
+exports the flat weights file the workers memory-map, then forks workers
+that each import api_predict and build their own serving state (model, job
+runner, explainer threads, catalog index). It never imports api_predict
+itself, so none of that is built a second time in a process that serves no
+requests.
+"""
+import os
+import torch
+import uvicorn
+
+from shared_weights import ensure_flat_weights
+
+MODEL_PATH = 'nasa_model.pth'
+
+def main():
+    # PORT is set by Render; WEB_CONCURRENCY is the uvicorn worker count
+    port = int(os.getenv('PORT', 8000))
+    workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    if workers > 1 and os.path.exists(MODEL_PATH) and not torch.cuda.is_available():
+        # exported once here, so the workers don't all race to write it
+        ensure_flat_weights(MODEL_PATH)
+    uvicorn.run('api_predict:app', host='0.0.0.0', port=port, workers=workers)
+
+if __name__ == '__main__':
+    main()
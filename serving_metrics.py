@@ -0,0 +1,163 @@
+# serving_metrics.py
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# latency buckets in seconds, from sub-millisecond inference to multi-second uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+def _format_value(v):
+    if v == math.inf:
+        return '+Inf'
+    return repr(float(v))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def render(self, const=()):
+        with self._lock:
+            items = list(self._children.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k, const)} {_format_value(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    """Gauge whose value is either set directly or read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self._function = function
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._children[self._key(labels)] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def render(self, const=()):
+        if self._function is not None:
+            items = [((), self._function())]
+        else:
+            with self._lock:
+                items = list(self._children.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k, const)} {_format_value(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is a bisect plus two additions under a lock"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][i] += 1
+            child[1] += value
+            child[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def render(self, const=()):
+        with self._lock:
+            items = [(k, (list(c[0]), c[1], c[2])) for k, c in self._children.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, list(const) + [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, const)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    """Metrics of one process. `const_labels` are added to every sample, e.g. the
+    pid of a uvicorn worker, whose registry only counts its own requests."""
+    def __init__(self, const_labels=None):
+        self._metrics = []
+        self.const_labels = dict(const_labels or {})
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        const = list(self.const_labels.items())
+        for metric in self._metrics:
+            lines.extend(metric.render(const))
+        return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram('exo_request_duration_seconds', 'End-to-end handler latency', ['endpoint'])
+PARSE_SECONDS = registry.histogram('exo_parse_duration_seconds', 'CSV parsing and cleaning time', ['endpoint'])
+FEATURE_SECONDS = registry.histogram('exo_feature_extraction_seconds', 'Feature extraction time per request or message', ['endpoint'])
+INFERENCE_SECONDS = registry.histogram('exo_inference_seconds', 'Model inference time per request or message', ['endpoint'])
+ROWS_PER_REQUEST = registry.histogram('exo_rows_per_request', 'Candidates scored per request or message', ['endpoint'], buckets=SIZE_BUCKETS)
+ROW_ERRORS = registry.counter('exo_row_errors_total', 'Rows that failed feature extraction or inference', ['endpoint'])
+REQUEST_ERRORS = registry.counter('exo_request_errors_total', 'Requests answered with an error payload', ['endpoint'])
+WS_MESSAGES = registry.counter('exo_ws_messages_total', 'WebSocket messages by direction', ['endpoint', 'direction'])
+WS_DROPPED = registry.counter('exo_ws_dropped_messages_total', 'Messages dropped or coalesced for slow WebSocket clients', ['reason'])
+WS_THROTTLED = registry.counter('exo_ws_throttled_total', 'WebSocket messages answered with slow_down', ['reason'])
+WS_CONNECTIONS = registry.gauge('exo_ws_active_connections', 'Currently open WebSocket connections')
+TORCH_THREADS = registry.gauge('exo_torch_intra_op_threads', 'Intra-op threads used for inference')
@@ -0,0 +1,103 @@
+# shared_weights.py
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+import torch
+
+from file_hash import file_sha256
+
+ALIGN = 64  # byte alignment of each tensor in the flat file
+
+def flat_paths(model_path):
+    """nasa_model.pth -> (nasa_model.bin, nasa_model.json)"""
+    base = os.path.splitext(model_path)[0]
+    return base + '.bin', base + '.json'
+
+def export_flat_weights(state_dict, bin_path, manifest_path, model_sha256=None):
+    """Write every tensor of state_dict back to back into one raw file plus a JSON manifest.
+
+    Both files go through a temp file and os.replace. The manifest lands
+    first and records the hashes of the source checkpoint and of the .bin,
+    so a crash between the two renames leaves a pair is_stale rejects.
+    """
+    tensors = {}
+    offset = 0
+    digest = hashlib.sha256()
+    tmp = bin_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        for name, t in state_dict.items():
+            arr = t.detach().cpu().contiguous().numpy()
+            pad = (-offset) % ALIGN
+            for chunk in (b'\0' * pad, arr.tobytes()):
+                f.write(chunk)
+                digest.update(chunk)
+            offset += pad
+            tensors[name] = {'offset': offset, 'shape': list(arr.shape), 'dtype': arr.dtype.str}
+            offset += arr.nbytes
+    manifest = {'model_sha256': model_sha256, 'bin_sha256': digest.hexdigest(), 'tensors': tensors}
+    manifest_tmp = manifest_path + '.tmp'
+    with open(manifest_tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_tmp, manifest_path)
+    os.replace(tmp, bin_path)
+
+def is_stale(model_path):
+    """True if the flat file is missing, torn, or was exported from a different checkpoint"""
+    bin_path, manifest_path = flat_paths(model_path)
+    if not (os.path.exists(bin_path) and os.path.exists(manifest_path)):
+        return True
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except ValueError:
+        return True
+    return manifest.get('model_sha256') != file_sha256(model_path) or manifest.get('bin_sha256') != file_sha256(bin_path)
+
+def ensure_flat_weights(model_path):
+    """(Re)export the flat file next to a torch checkpoint if it is missing or stale"""
+    if is_stale(model_path):
+        state = torch.load(model_path, map_location='cpu')
+        export_flat_weights(state, *flat_paths(model_path), model_sha256=file_sha256(model_path))
+    return flat_paths(model_path)
+
+def load_flat_weights(model, bin_path, manifest_path):
+    """Point model parameters/buffers at a copy-on-write memory map of the flat file.
+
+    Every process that maps the same file shares the physical pages through
+    the OS page cache, so N serving workers hold one copy of the weights.
+    Pages are only duplicated if a process writes to them, which inference
+    never does.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)['tensors']
+    raw = np.memmap(bin_path, dtype=np.uint8, mode='c')
+    tensors = dict(model.named_parameters())
+    tensors.update(dict(model.named_buffers()))
+    missing = set(tensors) - set(manifest)
+    if missing:
+        raise KeyError(f"Flat weights missing tensors: {sorted(missing)}")
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # torch warns about memmap-backed arrays
+        for name, entry in manifest.items():
+            if name not in tensors:
+                raise KeyError(f"Unexpected tensor in flat weights: {name}")
+            dtype = np.dtype(entry['dtype'])
+            count = int(np.prod(entry['shape'])) if entry['shape'] else 1
+            arr = raw[entry['offset']:entry['offset'] + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+            target = tensors[name]
+            if tuple(target.shape) != tuple(arr.shape):
+                raise ValueError(f"Shape mismatch for {name}: {tuple(arr.shape)} vs {tuple(target.shape)}")
+            target.data = torch.from_numpy(arr)
+    return model
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Export a state_dict checkpoint to a memory-mappable flat weights file')
+    parser.add_argument('model', nargs='?', default='nasa_model.pth')
+    args = parser.parse_args()
+    bin_path, manifest_path = flat_paths(args.model)
+    export_flat_weights(torch.load(args.model, map_location='cpu'), bin_path, manifest_path,
+                        model_sha256=file_sha256(args.model))
+    print("Saved:", bin_path, manifest_path)
@@ -0,0 +1,89 @@
+# similarity_index.py
+import numpy as np
+import pandas as pd
+import torch
+
+from features import catalog_feature_matrix
+
+# positions in the catalog feature vector of strictly positive, heavy-tailed
+# quantities (period, duration, depth, prad, teq, insol, srad, steff, smass, sage)
+# compared on a log scale so a 300-day period is not 100x "further" than a 3-day one
+LOG_FEATURES = [0, 3, 4, 5, 6, 7, 9, 10, 11, 12]
+
+class _Space:
+    """Float32 matrix with cached squared row norms for vectorized L2 search"""
+    def __init__(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def search(self, queries, k):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, one matrix product for the whole batch
+        d2 = self.sq_norms[None, :] - 2.0 * queries @ self.matrix.T
+        d2 += np.einsum('ij,ij->i', queries, queries)[:, None]
+        k = min(k, self.matrix.shape[0])
+        idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(d2, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+        dist = np.sqrt(np.maximum(np.take_along_axis(part, order, axis=1), 0.0))
+        return idx, dist
+
+class SimilarityIndex:
+    """k-nearest known KOIs in normalized catalog-feature space or model embedding space.
+
+    Features are log-scaled where heavy-tailed, then robust-standardized
+    (median / IQR over the catalog). Search is brute force over a float32
+    matrix: for ~10k KOIs one matrix product answers a query batch in well
+    under a millisecond per query, with no tree-building or approximation.
+    """
+    def __init__(self, X, kepids, names, dispositions, embed_fn=None):
+        self.kepids = np.asarray(kepids)
+        self.names = np.asarray(names)
+        self.dispositions = np.asarray(dispositions)
+        Z = self._transform_raw(X)
+        self.center = np.median(Z, axis=0)
+        q75, q25 = np.percentile(Z, [75, 25], axis=0)
+        scale = q75 - q25
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.spaces = {'features': _Space((Z - self.center) / self.scale)}
+        self.embed_fn = embed_fn
+        if embed_fn is not None:
+            self.spaces['embedding'] = _Space(embed_fn(X))
+
+    @staticmethod
+    def _transform_raw(X):
+        Z = np.array(X, dtype=np.float64)
+        Z[:, LOG_FEATURES] = np.log10(np.clip(Z[:, LOG_FEATURES], 1e-6, None))
+        return Z
+
+    def normalize(self, X):
+        return (self._transform_raw(X) - self.center) / self.scale
+
+    def __len__(self):
+        return len(self.kepids)
+
+    def query(self, X, k=10, space='features'):
+        """Neighbours for each row of raw feature matrix X (features.CATALOG_FEATURES order)"""
+        if space not in self.spaces:
+            raise ValueError(f"Unknown or unavailable space '{space}', choose from {sorted(self.spaces)}")
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        Q = self.normalize(X) if space == 'features' else self.embed_fn(X)
+        idx, dist = self.spaces[space].search(Q, k)
+        return [[{'kepid': int(self.kepids[i]), 'kepoi_name': str(self.names[i]),
+                  'disposition': str(self.dispositions[i]), 'distance': float(d)}
+                 for i, d in zip(row_idx, row_dist)]
+                for row_idx, row_dist in zip(idx, dist)]
+
+    @classmethod
+    def from_catalog(cls, csv_path, model=None, device=None):
+        df = pd.read_csv(csv_path, comment='#')
+        X = catalog_feature_matrix(df)
+        embed_fn = None
+        if model is not None:
+            def embed_fn(batch):
+                with torch.no_grad():
+                    x = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32)).to(device)
+                    return model.embed(x).cpu().numpy()
+        return cls(X, df['kepid'].to_numpy(), df['kepoi_name'].fillna('').astype(str).to_numpy(),
+                   df['koi_disposition'].fillna('').astype(str).to_numpy(), embed_fn)
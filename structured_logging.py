@@ -0,0 +1,128 @@
+# structured_logging.py
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+
+# correlation id of the HTTP request / WebSocket connection being handled
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+_listener = None
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured context goes in extra={'fields': {...}}"""
+    def format(self, record):
+        out = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            out.update(fields)
+        if record.exc_info:
+            out['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out['exc'] = record.exc_text
+        return json.dumps(out, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback out of msg.
+
+    The stock prepare() formats the record and folds the traceback into msg;
+    here msg stays the bare message and the traceback travels in exc_text,
+    which JsonFormatter emits as `exc` and TextFormatter appends as usual.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None  # tracebacks don't pickle and pin frames alive
+        return record
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in fields.items())
+        return line
+
+def configure_logging(level=None, fmt=None):
+    """Route the 'exoplanet' logger tree through a queue to a background writer thread.
+
+    Callers only pay for a queue put; formatting and stderr I/O happen on the
+    QueueListener thread, so logging never blocks the event loop. Level and
+    format default to the LOG_LEVEL (INFO) and LOG_FORMAT (json|text, json)
+    environment variables. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    q = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    # the request id lives in a contextvar, so it must be captured before the hand-off
+    handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger('exoplanet')
+    root.setLevel(level.upper())
+    root.addHandler(handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def get_logger(name):
+    return logging.getLogger(f'exoplanet.{name}')
+
+class SampledErrors:
+    """Logs the first `first` errors of a request, then one in every `every`.
+
+    summary() emits a single record with the total count, so suppressed
+    per-row errors are still accounted for without one line per row.
+    """
+    def __init__(self, logger, first=5, every=100):
+        self.logger = logger
+        self.first = first
+        self.every = every
+        self.count = 0
+        self.logged = 0
+
+    def error(self, msg, *args, **fields):
+        self.count += 1
+        if self.count <= self.first or (self.every and self.count % self.every == 0):
+            self.logged += 1
+            self.logger.warning(msg, *args, extra={'fields': dict(fields, error_index=self.count)})
+
+    def summary(self, msg, **fields):
+        if self.count > self.logged:
+            self.logger.warning(msg, extra={'fields': dict(fields, errors=self.count, logged=self.logged)})
@@ -0,0 +1,84 @@
+# synthetic_lc.py
+import numpy as np
+
+KEPLER_LONG_CADENCE_MIN = 29.4244
+KEPLER_SHORT_CADENCE_MIN = 0.9806
+TESS_2MIN_CADENCE_MIN = 2.0
+
+def transit_model(time, period, t0, depth, duration, ingress_frac=0.15):
+    """Trapezoidal transit: relative flux drop `depth` lasting `duration` (days)"""
+    phase = ((time - t0 + 0.5 * period) % period) - 0.5 * period  # days from mid-transit
+    half = 0.5 * duration
+    ingress = max(ingress_frac * duration, 1e-6)
+    dist = np.abs(phase)
+    # 1 inside the flat bottom, ramps linearly to 0 across ingress/egress
+    shape = np.clip((half - dist) / ingress, 0.0, 1.0)
+    return 1.0 - depth * shape
+
+def gap_mask(time, pattern='none', rng=None, gap_every=90.0, gap_length=1.0, dropout_frac=0.02, dropout_len=12):
+    """Boolean mask of samples to keep.
+
+    pattern: 'none'; 'periodic' (e.g. Kepler quarterly downlinks / TESS orbit
+    gaps: `gap_length` days every `gap_every` days); 'random' (short dropouts
+    covering ~`dropout_frac` of the samples, each `dropout_len` cadences long);
+    or a list of (start, end) day intervals to remove.
+    """
+    keep = np.ones(len(time), dtype=bool)
+    if pattern == 'none':
+        return keep
+    if pattern == 'periodic':
+        keep &= ((time - time[0]) % gap_every) >= gap_length
+        return keep
+    if pattern == 'random':
+        rng = rng if rng is not None else np.random.default_rng()
+        n_drop = int(dropout_frac * len(time) / max(dropout_len, 1))
+        for s in rng.integers(0, max(len(time) - dropout_len, 1), size=n_drop):
+            keep[s:s + dropout_len] = False
+        return keep
+    for start, end in pattern:
+        keep &= ~((time >= start) & (time < end))
+    return keep
+
+def synthetic_light_curve(baseline_days=90.0, cadence_min=KEPLER_LONG_CADENCE_MIN, noise_ppm=300.0,
+                          period=None, t0=None, depth_ppm=None, duration_hours=None, has_transit=True,
+                          variability_ppm=500.0, variability_period=None, gaps='none', seed=None, **gap_kwargs):
+    """Simulated light curve with optional transit, stellar variability, noise and gaps.
+
+    Parameters left as None are drawn at random. Returns a row dict with the
+    same keys process_row() expects ('time', 'flux', 'period', 't0') plus
+    'label' and the injected 'depth' / 'duration'.
+    """
+    rng = np.random.default_rng(seed)
+    if period is None:
+        period = float(np.exp(rng.uniform(np.log(0.8), np.log(min(30.0, baseline_days / 3)))))
+    if t0 is None:
+        t0 = float(rng.uniform(0, period))
+    if depth_ppm is None:
+        depth_ppm = float(np.exp(rng.uniform(np.log(100), np.log(10000))))
+    if duration_hours is None:
+        duration_hours = float(rng.uniform(1.0, 2.0) * 2.0 * period ** (1 / 3))
+    if variability_period is None:
+        variability_period = float(rng.uniform(5, 30))
+
+    cadence = cadence_min / (24 * 60)
+    time = np.arange(0.0, baseline_days, cadence)
+    flux = np.ones_like(time)
+    if variability_ppm:
+        phase = rng.uniform(0, 2 * np.pi)
+        flux *= 1.0 + 1e-6 * variability_ppm * np.sin(2 * np.pi * time / variability_period + phase)
+    if has_transit:
+        flux *= transit_model(time, period, t0, 1e-6 * depth_ppm, duration_hours / 24.0)
+    flux += rng.normal(0.0, 1e-6 * noise_ppm, size=len(time))
+
+    keep = gap_mask(time, gaps, rng=rng, **gap_kwargs)
+    return {
+        'time': time[keep], 'flux': flux[keep], 'period': period, 't0': t0,
+        'label': int(has_transit), 'depth': depth_ppm, 'duration': duration_hours,
+    }
+
+def synthetic_dataset(n, planet_frac=0.5, seed=0, **kwargs):
+    """List of n light-curve rows, a `planet_frac` share with injected transits"""
+    rng = np.random.default_rng(seed)
+    labels = rng.random(n) < planet_frac
+    seeds = rng.integers(0, 2**31 - 1, size=n)
+    return [synthetic_light_curve(has_transit=bool(lab), seed=int(s), **kwargs) for lab, s in zip(labels, seeds)]
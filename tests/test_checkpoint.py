@@ -0,0 +1,37 @@
+# tests/test_checkpoint.py
+import random
+import numpy as np
+import torch
+import torch.nn as nn
+
+from checkpoint import AsyncCheckpointer, training_state, load_training_state
+
+def _setup():
+    model = nn.Linear(4, 2)
+    opt = torch.optim.AdamW(model.parameters(), lr=1e-3)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(opt, mode='max')
+    return model, opt, scheduler
+
+def _step(model, opt):
+    opt.zero_grad()
+    model(torch.randn(8, 4)).sum().backward()
+    opt.step()
+
+def test_save_and_resume_round_trip(tmp_path):
+    torch.manual_seed(0)
+    model, opt, scheduler = _setup()
+    _step(model, opt)
+    path = str(tmp_path / 'checkpoint.pth')
+    checkpointer = AsyncCheckpointer()
+    checkpointer.save(training_state(model, opt, scheduler, None, epoch=3), path)
+    checkpointer.close()
+    expected = (random.random(), np.random.rand(), torch.rand(1).item())
+
+    resumed, resumed_opt, resumed_scheduler = _setup()
+    state = load_training_state(path, resumed, resumed_opt, resumed_scheduler, None, torch.device('cpu'))
+    assert state['epoch'] == 3
+    for a, b in zip(model.state_dict().values(), resumed.state_dict().values()):
+        assert torch.equal(a, b)
+    assert resumed_opt.state_dict()['state'][0]['step'] == opt.state_dict()['state'][0]['step']
+    # RNG streams continue from where the checkpoint was taken
+    assert (random.random(), np.random.rand(), torch.rand(1).item()) == expected
@@ -0,0 +1,64 @@
+# tests/test_connection_manager.py
+import asyncio
+
+from connection_manager import ConnectionManager
+
+class FakeWebSocket:
+    """Accepts and never finishes sending (a client that stopped reading), or fails every send"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+async def _fill_and_block(manager, ws):
+    await manager.connect(ws)
+    for i in range(manager.queue_size + 1):
+        await manager.send_personal_message(f'reply {i}', ws)
+    waiter = asyncio.create_task(manager.wait_writable(ws))
+    await asyncio.sleep(0.01)
+    return waiter
+
+def test_disconnect_releases_reader_blocked_on_full_outbox():
+    async def run():
+        manager = ConnectionManager(queue_size=4)
+        ws = FakeWebSocket()
+        waiter = await _fill_and_block(manager, ws)
+        assert not waiter.done()  # backpressure: the reader is parked
+        manager.disconnect(ws)
+        await asyncio.wait_for(waiter, timeout=1.0)
+    asyncio.run(run())
+
+def test_send_failure_releases_reader_blocked_on_full_outbox():
+    async def run():
+        manager = ConnectionManager(queue_size=4)
+        ws = FakeWebSocket(fail=True)
+        await manager.connect(ws)
+        # fill synchronously so the queue is full before the sender's first (failing) send
+        for i in range(manager.queue_size + 1):
+            await manager.send_personal_message(f'reply {i}', ws)
+        await asyncio.wait_for(manager.wait_writable(ws), timeout=1.0)
+        assert ws not in manager.active_connections
+    asyncio.run(run())
+
+def test_reply_overflow_disconnects_client():
+    async def run():
+        manager = ConnectionManager(queue_size=4, max_in_flight=2)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        for i in range(20):  # replies piling up faster than the client reads
+            await manager.send_personal_message(f'reply {i}', ws)
+        await asyncio.sleep(0.01)
+        assert ws not in manager.active_connections
+        assert ws.closed_with == 1013
+        assert manager.queue_depth(ws) == 0
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+# tests/test_embed.py
+import argparse
+import numpy as np
+import torch
+
+import embed
+from models import FullModel
+
+def _args(tmp_path, npz, model):
+    return argparse.Namespace(npz=str(npz), csv=None, model=str(model), out=str(tmp_path / 'emb.npy'),
+                              batch_size=2, n_features=13, catalog_only=False)
+
+def test_embeds_ragged_light_curves_in_row_order(tmp_path):
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    lengths = np.array([60, 120, 75, 90, 61])
+    curves = [rng.normal(size=n).astype(np.float32) for n in lengths]
+    np.savez(tmp_path / 'lc.npz', X=np.concatenate(curves), lengths=lengths, y=np.zeros(len(lengths), dtype=np.int64))
+    model = FullModel(seq_len=int(lengths.max()))
+    torch.save(model.state_dict(), tmp_path / 'model.pth')
+
+    embed.main(_args(tmp_path, tmp_path / 'lc.npz', tmp_path / 'model.pth'))
+
+    out = np.load(tmp_path / 'emb.npy')
+    model.eval()
+    with torch.no_grad():
+        expected = torch.cat([model.embed(torch.from_numpy(c)[None, None]) for c in curves]).numpy()
+    assert out.shape == expected.shape
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+
+def test_embeds_global_view(tmp_path):
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3, 201)).astype(np.float32)
+    X_global = rng.normal(size=(3, 101)).astype(np.float32)
+    np.savez(tmp_path / 'lc.npz', X=X, X_global=X_global, y=np.zeros(3, dtype=np.int64))
+    model = FullModel(seq_len=201, global_len=101)
+    torch.save(model.state_dict(), tmp_path / 'model.pth')
+
+    embed.main(_args(tmp_path, tmp_path / 'lc.npz', tmp_path / 'model.pth'))
+
+    model.eval()
+    with torch.no_grad():
+        expected = model.embed(torch.from_numpy(X)[:, None], x_global=torch.from_numpy(X_global)[:, None]).numpy()
+    np.testing.assert_allclose(np.load(tmp_path / 'emb.npy'), expected, atol=1e-5)
@@ -0,0 +1,40 @@
+# tests/test_eval_metrics.py
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, auc, f1_score, precision_recall_curve, roc_auc_score
+
+from eval_metrics import StreamingBinaryMetrics
+
+def _data(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n)
+    p = np.clip(rng.normal(0.35 + 0.3 * y, 0.2), 0, 1)
+    p[::7] = np.round(p[::7], 1)  # ties across batches
+    return y, p
+
+def _streamed(y, p, **kwargs):
+    m = StreamingBinaryMetrics(**kwargs)
+    for i in range(0, len(y), 137):
+        m.update(y[i:i+137], p[i:i+137])
+    return m.compute()
+
+def test_exact_mode_matches_sklearn():
+    y, p = _data()
+    s = _streamed(y, p)
+    precision, recall, _ = precision_recall_curve(y, p)
+    assert s['pr_auc'] == pytest.approx(auc(recall, precision), abs=1e-12)
+    assert s['roc_auc'] == pytest.approx(roc_auc_score(y, p), abs=1e-12)
+    assert s['acc'] == pytest.approx(accuracy_score(y, p >= 0.5))
+    assert s['f1'] == pytest.approx(f1_score(y, p >= 0.5))
+    assert s['n'] == len(y)
+
+def test_binned_mode_is_close_to_sklearn():
+    y, p = _data()
+    s = _streamed(y, p, n_bins=1000)
+    assert s['roc_auc'] == pytest.approx(roc_auc_score(y, p), abs=1e-3)
+    precision, recall, _ = precision_recall_curve(y, p)
+    assert s['pr_auc'] == pytest.approx(auc(recall, precision), abs=1e-2)
+
+def test_single_class_aucs_are_nan():
+    s = _streamed(np.zeros(10, dtype=int), np.linspace(0, 1, 10))
+    assert np.isnan(s['roc_auc']) and np.isnan(s['pr_auc'])
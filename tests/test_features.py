@@ -0,0 +1,44 @@
+# tests/test_features.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import BKJD_OFFSET, CATALOG_FEATURES, FEATURE_DEFAULTS, catalog_feature_matrix
+
+def test_bjd_epoch_gives_the_same_features_as_bkjd():
+    bkjd = {'koi_period': 9.49, 'koi_time0bk': 170.54, 'koi_depth': 615.8}
+    bjd = dict(bkjd, koi_time0bk=bkjd['koi_time0bk'] + BKJD_OFFSET)
+    X = catalog_feature_matrix([bkjd, bjd])
+    np.testing.assert_array_equal(X[0], X[1])
+
+def _row(**fields):
+    return dict({'koi_period': 9.49, 'koi_time0bk': 170.54}, **fields)
+
+def test_absent_and_nan_values_take_schema_defaults():
+    X = catalog_feature_matrix([_row(koi_impact=None, koi_depth=0.0)])
+    assert X.dtype == np.float32 and X.shape == (1, len(CATALOG_FEATURES))
+    assert X[0, CATALOG_FEATURES.index('koi_impact')] == np.float32(FEATURE_DEFAULTS['koi_impact'])
+    assert X[0, CATALOG_FEATURES.index('koi_depth')] == 0.0  # zeros are kept
+    assert X[0, CATALOG_FEATURES.index('koi_teq')] == np.float32(FEATURE_DEFAULTS['koi_teq'])
+
+@pytest.mark.parametrize('bad', [
+    {'koi_impact': 500.0},           # above the valid range
+    {'koi_depth': -1.0},             # below it
+    {'koi_teq': 'hot'},              # non-numeric
+    {'koi_period': None},            # missing required value
+    {'koi_time0bk': float('nan')},
+])
+def test_invalid_rows_are_rejected_or_flagged(bad):
+    rows = [_row(), _row(**bad), _row()]
+    with pytest.raises(ValueError):
+        catalog_feature_matrix(rows)
+    X, invalid = catalog_feature_matrix(rows, return_invalid=True)
+    assert invalid.tolist() == [False, True, False]
+    np.testing.assert_array_equal(X[1], np.array([FEATURE_DEFAULTS[f] for f in CATALOG_FEATURES], dtype=np.float32))
+
+def test_missing_required_column_raises_keyerror():
+    with pytest.raises(KeyError):
+        catalog_feature_matrix(pd.DataFrame({'koi_period': [9.49]}))
+    # without `require`, absent required columns fall back to their defaults too
+    X = catalog_feature_matrix(pd.DataFrame({'koi_period': [9.49]}), require=False)
+    assert X[0, CATALOG_FEATURES.index('koi_time0bk')] == np.float32(FEATURE_DEFAULTS['koi_time0bk'])
@@ -0,0 +1,39 @@
+# tests/test_inference_batcher.py
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+from inference_batcher import InferenceBatcher
+
+def test_batches_concurrent_requests():
+    sizes = []
+    def predict(X):
+        sizes.append(len(X))
+        return X[:, 0]
+    async def run():
+        batcher = InferenceBatcher(predict)
+        probs = await asyncio.gather(*(batcher.predict(np.full(3, i, np.float32)) for i in range(5)))
+        await batcher.close()
+        return probs
+    assert asyncio.run(run()) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert sum(sizes) == 5
+
+def test_close_cancels_drain_task_and_pending():
+    release = threading.Event()
+    def predict(X):
+        release.wait(5)
+        return X[:, 0]
+    async def run():
+        batcher = InferenceBatcher(predict)
+        first = asyncio.ensure_future(batcher.predict(np.zeros(3, np.float32)))
+        await asyncio.sleep(0.01)  # first batch is now in the executor
+        queued = asyncio.ensure_future(batcher.predict(np.ones(3, np.float32)))
+        await asyncio.sleep(0)
+        await batcher.close()
+        release.set()
+        assert batcher._task is None and not batcher._draining
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        first.cancel()
+    asyncio.run(run())
@@ -0,0 +1,75 @@
+# tests/test_jobs.py
+import os
+import time
+import pandas as pd
+
+from jobs import JobStore, JobRunner
+
+def _positive_x(columns):
+    return lambda df: df[df['x'] > 0]
+
+def _score(df):
+    return pd.DataFrame({'id': df['id'].astype(str), 'prob_planet': 0.5, 'error': None})
+
+def _wait(store, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job still {store.get(job_id)['status']}")
+
+def _submit(store, runner, text):
+    job_id = store.create('t.csv')
+    with open(store.input_path(job_id), 'w') as f:
+        f.write(text)
+    runner.submit(job_id)
+    return job_id
+
+def test_rows_dropped_by_cleaning_are_counted(tmp_path):
+    store = JobStore(str(tmp_path))
+    runner = JobRunner(store, _positive_x, _score, chunk_rows=2)
+    job = _wait(store, _submit(store, runner, 'id,x\n1,1\n2,-1\n3,2\n4,0\n5,3\n'))
+    assert job['status'] == 'done'
+    assert (job['done_rows'], job['dropped_rows'], job['error_rows']) == (5, 2, 0)
+    assert len(pd.read_csv(store.result_path(job['id']))) == 3
+
+def _leave_running(store, text, owner_pid, age):
+    """A job an earlier process claimed and never finished"""
+    job_id = store.create('t.csv')
+    with open(store.input_path(job_id), 'w') as f:
+        f.write(text)
+    store.claim(job_id)
+    store.update(job_id, owner_pid=owner_pid)
+    with store._connect() as db:
+        db.execute('UPDATE jobs SET updated = ? WHERE id = ?', (time.time() - age, job_id))
+    return job_id
+
+def test_startup_recovers_job_left_running_under_the_same_pid(tmp_path):
+    # a restarted container usually gets the dead server's PID back
+    store = JobStore(str(tmp_path))
+    job_id = _leave_running(store, 'id,x\n1,1\n', os.getpid(), age=0)
+    JobRunner(store, _positive_x, _score)
+    assert _wait(store, job_id)['status'] == 'done'
+
+def test_job_without_heartbeat_is_requeued(tmp_path):
+    store = JobStore(str(tmp_path))
+    runner = JobRunner(store, _positive_x, _score, heartbeat_seconds=0.05, stale_after=0.3)
+    job_id = _leave_running(store, 'id,x\n1,1\n', os.getpid() + 1, age=0)
+    assert store.get(job_id)['status'] == 'running'
+    assert _wait(store, job_id)['status'] == 'done'
+
+def test_live_job_is_not_taken_over(tmp_path):
+    calls = []
+    def slow_score(df):
+        calls.append(len(df))
+        time.sleep(0.3)
+        return _score(df)
+    store = JobStore(str(tmp_path))
+    kwargs = dict(heartbeat_seconds=0.05, stale_after=0.2)
+    first = JobRunner(store, _positive_x, slow_score, chunk_rows=1, **kwargs)
+    job_id = _submit(store, first, 'id,x\n1,1\n2,2\n3,3\n')
+    JobRunner(store, _positive_x, slow_score, **kwargs)  # a second worker process starting up
+    assert _wait(store, job_id)['status'] == 'done'
+    assert calls == [1, 1, 1]
@@ -0,0 +1,60 @@
+# tests/test_models.py
+import copy
+import pytest
+import torch
+
+from models import TimeCNN, FullModel, padding_mask
+
+def _padded(curves, extra=0):
+    lengths = torch.tensor([c.shape[-1] for c in curves])
+    x = torch.zeros(len(curves), 1, int(lengths.max()) + extra)
+    for i, c in enumerate(curves):
+        x[i, :, :c.shape[-1]] = c
+    return x, padding_mask(lengths, x.size(-1))
+
+def test_timecnn_padding_matches_unpadded_in_train_mode():
+    torch.manual_seed(0)
+    cnn = TimeCNN(101).train()
+    padded_cnn = copy.deepcopy(cnn)
+    x = torch.randn(4, 1, 101)
+    xp, mask = _padded(list(x), extra=37)
+    xp[:, :, 101:] = 5.0  # garbage in the padding must not matter
+    out = cnn(x)
+    out_padded = padded_cnn(xp, mask)
+    assert torch.allclose(out, out_padded, atol=1e-5)
+    # and the running statistics the batch leaves behind are the same
+    for a, b in zip(cnn.buffers(), padded_cnn.buffers()):
+        assert torch.allclose(a.float(), b.float(), atol=1e-5)
+
+def test_timecnn_ragged_batch_matches_each_curve_alone_in_eval_mode():
+    torch.manual_seed(0)
+    cnn = TimeCNN(120)
+    cnn.train()(torch.randn(8, 1, 120))  # non-trivial running statistics
+    cnn.eval()
+    curves = [torch.randn(1, n) for n in (120, 77, 101)]
+    x, mask = _padded(curves)
+    with torch.no_grad():
+        batched = cnn(x, mask)
+        alone = torch.cat([cnn(c[None]) for c in curves])
+    assert torch.allclose(batched, alone, atol=1e-5)
+
+def test_timecnn_loads_sequential_checkpoints():
+    torch.manual_seed(0)
+    source = FullModel(201)
+    renamed = {'block1.': 'net.0.', 'block2.': 'net.2.', 'block3.': 'net.4.', 'fc.': 'net.7.'}
+    legacy = {}
+    for key, value in source.state_dict().items():
+        for new, old in renamed.items():
+            key = key.replace('cnn.' + new, 'cnn.' + old)
+        legacy[key] = value
+    assert 'cnn.net.0.conv.weight' in legacy
+    model = FullModel(201)
+    model.load_state_dict(legacy)
+    for key, value in source.state_dict().items():
+        assert torch.equal(model.state_dict()[key], value)
+
+def test_global_view_model_requires_x_global():
+    model = FullModel(201, global_len=101).eval()
+    with pytest.raises(ValueError, match='x_global'):
+        model.embed(torch.randn(2, 1, 201))
+    assert model.embed(torch.randn(2, 1, 201), x_global=torch.randn(2, 1, 101)).shape == (2, model.embedding_dim)
@@ -0,0 +1,42 @@
+# tests/test_normalization.py
+import numpy as np
+import pytest
+import torch
+
+from models import FullModel
+from normalization import fit_input_norm, apply_input_norm, fold_input_norm, input_linear
+
+def _raw_features(n=256, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(mean=3.0, sigma=2.0, size=(n, 13)).astype(np.float32)  # skewed, wide ranges
+    X[:, 11:] = 1.0  # constant columns, like koi_smass / koi_sage
+    return X
+
+@pytest.mark.parametrize('method', ['robust', 'standard'])
+@pytest.mark.parametrize('catalog_only', [True, False])
+def test_folded_model_matches_normalize_then_forward(method, catalog_only):
+    torch.manual_seed(0)
+    X = _raw_features()
+    norm = fit_input_norm(X[:200], method)
+    if catalog_only:
+        model = FullModel(seq_len=13, n_tab_features=13, catalog_only=True).eval()
+        run = lambda m, feats: m(torch.from_numpy(feats))
+    else:
+        model = FullModel(seq_len=64, n_tab_features=13).eval()
+        curves = torch.randn(len(X), 1, 64)
+        run = lambda m, feats: m(curves, tab=torch.from_numpy(feats))
+    folded = fold_input_norm(model, norm)
+    with torch.no_grad():
+        expected = run(model, apply_input_norm(X, norm))
+        actual = run(folded, X)
+    torch.testing.assert_close(actual, expected, rtol=1e-4, atol=1e-4)
+    # the fold works on a copy; the original model is left untouched
+    assert not torch.equal(input_linear(folded).weight, input_linear(model).weight)
+
+def test_constant_columns_get_unit_scale():
+    norm = fit_input_norm(_raw_features(), 'robust')
+    assert np.all(norm['scale'][11:] == 1.0)
+
+def test_fold_needs_a_tabular_input_layer():
+    with pytest.raises(ValueError):
+        fold_input_norm(FullModel(seq_len=64), fit_input_norm(_raw_features()))
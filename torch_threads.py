@@ -0,0 +1,80 @@
+# torch_threads.py
+import os
+import time
+import torch
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else None
+
+def cpu_budget(workers=1):
+    """Cores available to one worker when `workers` processes share the machine"""
+    return max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+def configure_interop_threads(inter=None):
+    """Set the inter-op pool size; must run before any inter-op parallel work starts.
+
+    Serving runs each forward pass inline, so the inter-op pool is idle and one
+    thread avoids parking a pool of idle threads per worker. Override with
+    TORCH_INTER_OP_THREADS.
+    """
+    inter = inter or _env_int('TORCH_INTER_OP_THREADS') or 1
+    try:
+        torch.set_num_interop_threads(inter)
+    except RuntimeError:
+        pass  # already fixed by an earlier call or by parallel work; keep the existing pool
+    return torch.get_num_interop_threads()
+
+def time_forward(model, example, repeats=50):
+    """Median seconds per forward pass of `example`"""
+    with torch.inference_mode():
+        for _ in range(5):
+            model(example)
+        samples = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            model(example)
+            samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def autotune_intra_threads(model, example, max_threads, tolerance=0.05, repeats=50):
+    """Pick the intra-op thread count with the lowest median latency on `example`.
+
+    Candidates are powers of two up to max_threads (plus max_threads itself).
+    Ties within `tolerance` go to fewer threads: tiny MLP forwards gain
+    little from more threads, and spare cores serve concurrent requests.
+    Returns (threads, {threads: seconds}).
+    """
+    candidates = sorted({t for t in (1, 2, 4, 8, 16, 32, 64) if t <= max_threads} | {max_threads})
+    timings = {}
+    for t in candidates:
+        torch.set_num_threads(t)
+        timings[t] = time_forward(model, example, repeats)
+    best = min(timings.values())
+    chosen = min(t for t, s in timings.items() if s <= best * (1 + tolerance))
+    torch.set_num_threads(chosen)
+    return chosen, timings
+
+def configure_intra_threads(model=None, example=None, workers=1):
+    """Set intra-op threads for serving and return a summary dict.
+
+    Precedence: TORCH_INTRA_OP_THREADS if set; otherwise, with
+    TORCH_THREADS_AUTOTUNE=1 and a model/example, a startup micro-benchmark
+    over the worker's core budget; otherwise, with several workers, the
+    core budget itself (cpu_count // workers). A single worker keeps torch's
+    own default.
+    """
+    budget = cpu_budget(workers)
+    fixed = _env_int('TORCH_INTRA_OP_THREADS')
+    if fixed:
+        torch.set_num_threads(fixed)
+        return {'intra_op': fixed, 'source': 'env'}
+    if os.getenv('TORCH_THREADS_AUTOTUNE', '0') == '1' and model is not None and example is not None:
+        chosen, timings = autotune_intra_threads(model, example, budget)
+        return {'intra_op': chosen, 'source': 'autotune',
+                'latency_us': {t: round(s * 1e6, 1) for t, s in timings.items()}}
+    if workers <= 1:
+        return {'intra_op': torch.get_num_threads(), 'source': 'torch_default'}
+    torch.set_num_threads(budget)
+    return {'intra_op': budget, 'source': 'cpu_budget'}
@@ -4,31 +4,47 @@ import torch.nn as nn
 import numpy as np
 from torch.utils.data import DataLoader, Dataset
 from sklearn.model_selection import StratifiedKFold, train_test_split
-from sklearn.metrics import precision_recall_curve, auc, roc_auc_score, accuracy_score, f1_score
 import argparse
-from dataset import LC_Dataset
+from dataset import LC_Dataset, LengthBucketSampler, pad_collate
 from models import FullModel
 from tqdm import tqdm
 import os
+from eval_metrics import StreamingBinaryMetrics
+from instrumentation import StepTimer, make_profiler
+from checkpoint import AsyncCheckpointer, cpu_state_dict, training_state, load_training_state
+from normalization import NORM_METHODS, fit_input_norm, apply_input_norm, fold_input_norm
+from precision import PRECISIONS, resolve_precision, bf16_supported, autocast
 
-def train_epoch(model, loader, opt, scaler, device, loss_fn):
+def train_epoch(model, loader, opt, scaler, device, loss_fn, timer=None, profiler=None, precision='fp32'):
     model.train()
+    if timer is None:
+        timer = StepTimer(device, enabled=False)
     total_loss = 0.0
-    for x,y in loader:
-        x = x.to(device)
-        y = y.to(device)
+    for x, y, *extra in timer.iterate(loader):  # extra: model kwargs such as mask and x_global
+        with timer.phase('h2d'):
+            x = x.to(device)
+            y = y.to(device)
+            kwargs = {k: v.to(device) for k, v in extra[0].items()} if extra else {}
         opt.zero_grad()
-        with torch.cuda.amp.autocast(enabled=scaler is not None):
-            logits = model(x)
-            loss = loss_fn(logits, y)
-        if scaler is not None:
-            scaler.scale(loss).backward()
-            scaler.step(opt)
-            scaler.update()
-        else:
-            loss.backward()
-            opt.step()
+        with timer.phase('forward'):
+            with autocast(device, precision, cuda_fp16=scaler is not None):
+                logits = model(x, **kwargs)
+                loss = loss_fn(logits, y)
+        with timer.phase('backward'):
+            if scaler is not None:
+                scaler.scale(loss).backward()
+            else:
+                loss.backward()
+        with timer.phase('optimizer'):
+            if scaler is not None:
+                scaler.step(opt)
+                scaler.update()
+            else:
+                opt.step()
         total_loss += float(loss.item()) * x.size(0)
+        timer.step(x.size(0))
+        if profiler is not None:
+            profiler.step()
     return total_loss / len(loader.dataset)
 
 class CatalogDataset(Dataset):
@@ -44,42 +60,46 @@ class CatalogDataset(Dataset):
     def __getitem__(self, idx):
         return torch.tensor(self.X[idx], dtype=torch.float32), torch.tensor(self.y[idx], dtype=torch.long)
 
-def eval_model(model, loader, device):
+def eval_model(model, loader, device, n_bins=None, log_every=0, precision='fp32'):
+    """Validation metrics accumulated batch by batch (see StreamingBinaryMetrics)"""
     model.eval()
-    ys = []
-    ps = []
+    metrics = StreamingBinaryMetrics(n_bins=n_bins)
     with torch.no_grad():
-        for x,y in loader:
+        for step, (x, y, *extra) in enumerate(loader, 1):
             x = x.to(device)
-            logits = model(x)
-            prob = torch.softmax(logits, dim=1)[:,1].detach().cpu().numpy()
-            ps.append(prob)
-            ys.append(y.numpy())
-    y_true = np.concatenate(ys)
-    p = np.concatenate(ps)
-    # metrics
-    pr, rc, _ = precision_recall_curve(y_true, p)
-    pr_auc = auc(rc, pr)   # note: auc expects x,y but we keep as auc(recall,precision) -> PR AUC
-    roc = roc_auc_score(y_true, p)
-    p_bin = (p >= 0.5).astype(int)
-    acc = accuracy_score(y_true, p_bin)
-    f1 = f1_score(y_true, p_bin)
-    return {'pr_auc':pr_auc, 'roc_auc':roc, 'acc':acc, 'f1':f1, 'y_true':y_true, 'p':p}
+            kwargs = {k: v.to(device) for k, v in extra[0].items()} if extra else {}
+            with autocast(device, precision):
+                logits = model(x, **kwargs)
+            prob = torch.softmax(logits.float(), dim=1)[:,1].detach().cpu().numpy()
+            metrics.update(y.numpy(), prob)
+            if log_every and step % log_every == 0:
+                s = metrics.compute()
+                print(f"  eval step {step} n {s['n']} pr_auc {s['pr_auc']:.4f} roc {s['roc_auc']:.4f} f1 {s['f1']:.4f}")
+    stats = metrics.compute()
+    stats['y_true'], stats['p'] = metrics.arrays()
+    return stats
 
 def main(args):
     npz = args.npz
     data = np.load(npz)
     X = data['X']
     y = data['y']
+    lengths = data['lengths'] if 'lengths' in data else None  # ragged light curves (preprocess --variable-length)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
     # Determine if using catalog features
-    catalog_only = args.catalog_only or (X.shape[1] > 1000)  # Heuristic: catalog features are many
+    catalog_only = args.catalog_only or (lengths is None and X.shape[1] > 1000)  # Heuristic: catalog features are many
+    seq_len = int(lengths.max()) if lengths is not None else X.shape[1]
 
     # train/val split
     train_idx, val_idx = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
 
+    input_norm = None
     if catalog_only:
+        if args.normalize != 'none':
+            # fitted on the training split only; applied once here, folded into the model on save
+            input_norm = fit_input_norm(X[train_idx], args.normalize)
+            X = apply_input_norm(X, input_norm)
         # For catalog features, create simple dataset
         train_ds = CatalogDataset(X, y, train_idx)
         val_ds = CatalogDataset(X, y, val_idx)
@@ -89,14 +109,27 @@ def main(args):
     else:
         train_ds = LC_Dataset(npz, indices=train_idx, augment=True)
         val_ds = LC_Dataset(npz, indices=val_idx, augment=False)
-        train_loader = DataLoader(train_ds, batch_size=64, shuffle=True, num_workers=4)
-        val_loader = DataLoader(val_ds, batch_size=128, shuffle=False, num_workers=4)
+        if train_ds.variable_length:
+            # similar lengths share a batch, padded to its longest curve and masked in the model
+            train_loader = DataLoader(train_ds, batch_sampler=LengthBucketSampler(train_ds.lengths, 64),
+                                      collate_fn=pad_collate, num_workers=4)
+            val_loader = DataLoader(val_ds, batch_sampler=LengthBucketSampler(val_ds.lengths, 128, shuffle=False),
+                                    collate_fn=pad_collate, num_workers=4)
+        else:
+            train_loader = DataLoader(train_ds, batch_size=64, shuffle=True, num_workers=4)
+            val_loader = DataLoader(val_ds, batch_size=128, shuffle=False, num_workers=4)
         n_features = 0
 
-    model = FullModel(seq_len=X.shape[1], n_tab_features=n_features, catalog_only=catalog_only).to(device)
+    global_len = 0 if catalog_only else train_ds.global_len  # global view stored by preprocess
+    model = FullModel(seq_len=seq_len, n_tab_features=n_features, catalog_only=catalog_only,
+                      global_len=global_len).to(device)
     opt = torch.optim.AdamW(model.parameters(), lr=1e-3, weight_decay=1e-5)
     scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(opt, mode='max', factor=0.5, patience=4)
-    scaler = torch.cuda.amp.GradScaler() if torch.cuda.is_available() else None
+    precision = resolve_precision(args.precision)
+    if precision == 'bf16' and not bf16_supported(device):
+        print("Warning: no native bfloat16 kernels on this device; bf16 will be emulated and slower")
+    # bf16 keeps fp32's exponent range, so only the CUDA fp16 path needs loss scaling
+    scaler = torch.cuda.amp.GradScaler() if torch.cuda.is_available() and precision == 'fp32' else None
 
     # class weights for imbalance
     from collections import Counter
@@ -109,22 +142,75 @@ def main(args):
     best_metric = 0.0
     patience = 10
     wait = 0
-    for epoch in range(1, args.epochs+1):
-        train_loss = train_epoch(model, train_loader, opt, scaler, device, loss_fn)
-        stats = eval_model(model, val_loader, device)
-        val_metric = stats['pr_auc']  # optimize PR-AUC
-        scheduler.step(val_metric)
-        print(f"Epoch {epoch} train_loss {train_loss:.4f} val_pr_auc {stats['pr_auc']:.4f} roc {stats['roc_auc']:.4f} f1 {stats['f1']:.4f}")
-        if val_metric > best_metric:
-            best_metric = val_metric
-            torch.save(model.state_dict(), args.save)
-            print("Saved best:", args.save)
-            wait = 0
-        else:
-            wait += 1
-            if wait >= patience:
-                print("Early stopping")
+    start_epoch = 1
+    if args.resume:
+        state = load_training_state(args.resume, model, opt, scheduler, scaler, device)
+        start_epoch = state['epoch'] + 1
+        best_metric = state['best_metric']
+        wait = state['wait']
+        print(f"Resumed from {args.resume} at epoch {start_epoch}")
+
+    writer = None
+    if args.log_dir:
+        from torch.utils.tensorboard import SummaryWriter
+        writer = SummaryWriter(args.log_dir)
+    timer = StepTimer(device, enabled=args.timing or args.profile_steps > 0, label_ranges=args.profile_steps > 0)
+
+    checkpointer = AsyncCheckpointer()
+    completed = False
+    try:
+        for epoch in range(start_epoch, args.epochs+1):
+            timer.reset()
+            if args.profile_steps > 0 and epoch == start_epoch:
+                # capture a window of steps from the first epoch run
+                with make_profiler(os.path.join(args.log_dir or 'runs', 'profile'), args.profile_steps) as prof:
+                    train_loss = train_epoch(model, train_loader, opt, scaler, device, loss_fn, timer, prof, precision)
+            else:
+                train_loss = train_epoch(model, train_loader, opt, scaler, device, loss_fn, timer, precision=precision)
+            if timer.enabled:
+                print(f"Epoch {epoch} timing: {timer.format()}")
+            stats = eval_model(model, val_loader, device, n_bins=args.eval_bins or None, log_every=args.eval_log_every,
+                               precision=precision)
+            val_metric = stats['pr_auc']  # optimize PR-AUC
+            scheduler.step(val_metric)
+            print(f"Epoch {epoch} train_loss {train_loss:.4f} val_pr_auc {stats['pr_auc']:.4f} roc {stats['roc_auc']:.4f} f1 {stats['f1']:.4f}")
+            if writer is not None:
+                writer.add_scalar('train/loss', train_loss, epoch)
+                for name in ('pr_auc', 'roc_auc', 'acc', 'f1'):
+                    writer.add_scalar(f'val/{name}', stats[name], epoch)
+                if timer.enabled:
+                    for name, value in timer.summary().items():
+                        writer.add_scalar(f'timing/{name}', value, epoch)
+            stop = False
+            if val_metric > best_metric:
+                best_metric = val_metric
+                # saved model takes raw features: normalization lives in its first Linear
+                export = fold_input_norm(model, input_norm) if input_norm is not None else model
+                checkpointer.save(cpu_state_dict(export), args.save)
+                print("Saved best:", args.save)
+                wait = 0
+            else:
+                wait += 1
+                if wait >= patience:
+                    print("Early stopping")
+                    stop = True
+            if stop or epoch % args.checkpoint_every == 0:
+                state = training_state(model, opt, scheduler, scaler, epoch, best_metric=best_metric, wait=wait,
+                                       input_norm=input_norm)
+                checkpointer.save(state, args.checkpoint)
+            if stop:
                 break
+        completed = True
+    finally:
+        try:
+            checkpointer.close()
+        except RuntimeError as e:
+            if completed:
+                raise
+            # don't mask the exception that ended training
+            print(f"Warning: {e}")
+        if writer is not None:
+            writer.close()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -132,5 +218,17 @@ if __name__ == '__main__':
     parser.add_argument('--epochs', type=int, default=50)
     parser.add_argument('--save', default='best_model.pth')
     parser.add_argument('--catalog-only', action='store_true', help='Use catalog features only (no light curves)')
+    parser.add_argument('--normalize', choices=NORM_METHODS, default='robust',
+                        help='Input scaling for catalog features, fitted on the training split and folded into the saved model')
+    parser.add_argument('--precision', choices=PRECISIONS, default=None,
+                        help='Autocast precision for training and evaluation (default: TORCH_PRECISION env var, else fp32)')
+    parser.add_argument('--checkpoint', default='checkpoint.pth', help='Full training-state checkpoint path')
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='Write a training-state checkpoint every N epochs')
+    parser.add_argument('--eval-bins', type=int, default=0, help='Histogram bins for streaming PR/ROC metrics (0 = exact, single sort)')
+    parser.add_argument('--eval-log-every', type=int, default=0, help='Print running validation metrics every N batches')
+    parser.add_argument('--timing', action='store_true', help='Print per-step data/h2d/forward/backward/optimizer times and samples/sec')
+    parser.add_argument('--profile-steps', type=int, default=0, help='Capture N training steps with torch.profiler (implies --timing)')
+    parser.add_argument('--log-dir', default=None, help='TensorBoard log directory for metrics, timings and profiler traces')
+    parser.add_argument('--resume', default=None, help='Resume training from a checkpoint written by --checkpoint')
     args = parser.parse_args()
     main(args)
\ No newline at end of file